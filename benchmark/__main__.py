@@ -0,0 +1,262 @@
+"""
+Benchmarks the hot paths against a local stand-in for Yahoo Finance and the ECB, at several data
+sizes and concurrency levels, and writes the results as JSON so that runs of different versions
+can be compared.
+
+Usage
+-----
+    python -m benchmark [--sizes 100,1000,10000] [--concurrency 1,8,32] [--requests 64]
+                        [--repeat 5] [--output results.json] [--compare previous.json]
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import currency
+from order import Orders
+from price import Price
+import ticker
+from ticker import Ticker
+import yahoo
+from benchmark.server import StandInServer
+
+
+def benchmarkLoadConverter(size, directory):
+
+    """Loading the exchange rates: downloading and parsing the table, then reading it back from the cache."""
+
+    def download():
+        currency.CURRENCY_CONVERTER = None
+        currency._CurrencyConverter.download()
+
+    def load():
+        currency._CurrencyConverter.load(directory)
+
+    currency._CurrencyConverter.load(directory)
+    yield 'currency.download', {}, 1, download
+    yield 'currency.load (cached)', {}, 1, load
+
+
+def benchmarkExchangeRates(size, directory):
+
+    """Scalar exchange rate lookups and conversions, for random currency pairs and dates."""
+
+    converter = currency._getCurrencyConverter()
+    random = numpy.random.default_rng(size)
+    currencies = sorted(converter.getAvailableCurrencies())
+    bases = random.choice(currencies, size).tolist()
+    targets = random.choice(currencies, size).tolist()
+    dates = random.choice(converter.dates, size).tolist()
+    prices = [Price(value, base) for value, base in zip(random.uniform(1., 100., size).tolist(), bases)]
+
+    def getExchangeRate():
+        for base, target, date in zip(bases, targets, dates):
+            currency.getExchangeRate(base, target, date=date, asOf=True)
+
+    def convert():
+        for price, target, date in zip(prices, targets, dates):
+            price.convert(target, date=date, asOf=True)
+
+    def convertBatch():
+        Price.convertBatch(prices, 'USD', dates=dates, asOf=True)
+
+    yield 'currency.getExchangeRate', {'size': size}, size, getExchangeRate
+    yield 'Price.convert', {'size': size}, size, convert
+    yield 'Price.convertBatch', {'size': size}, size, convertBatch
+
+
+def benchmarkOrders(size, directory):
+
+    """Parsing orders from JSON text and from JSON and JSON Lines files."""
+
+    random = numpy.random.default_rng(size)
+    orders = [
+        {
+            'symbol': f'SYM{index % 100}',
+            'direction': 'buy' if index % 3 else 'sell',
+            'quantity': int(random.integers(1, 100)),
+            'price': {'value': round(float(random.uniform(1., 100.)), 2), 'currency': 'USD'},
+            'fee': {'value': 1., 'currency': 'USD'},
+            'date': str(numpy.datetime64('2010-01-01') + int(random.integers(0, 4000))),
+        }
+        for index in range(size)
+    ]
+    text = json.dumps(orders)
+    path = os.path.join(directory, f'orders-{size}.json')
+    with open(path, 'w') as file:
+        file.write(text)
+    linesPath = os.path.join(directory, f'orders-{size}.jsonl')
+    with open(linesPath, 'w') as file:
+        file.writelines(json.dumps(order) + '\n' for order in orders)
+
+    yield 'Orders.fromJSON', {'size': size}, size, lambda: Orders.fromJSON(text)
+    yield 'Orders.fromFile (JSON)', {'size': size}, size, lambda: Orders.fromFile(path)
+    yield 'Orders.fromFile (JSON Lines)', {'size': size}, size, lambda: Orders.fromFile(linesPath)
+
+
+def benchmarkHistories(size, directory, concurrency, requests):
+
+    """Requesting the histories of many tickers, each over 'size' days, from concurrent threads."""
+
+    endDate = datetime.date.today() - datetime.timedelta(days=1)
+    startDate = endDate - datetime.timedelta(days=size - 1)
+    tickers = [Ticker(f'SYM{index}') for index in range(requests)]
+
+    def getHistories():
+        yahoo.clearCache()
+        ticker.HISTORY_STORE.clear()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda item: item.getHistory(startDate, endDate), tickers))
+
+    yield 'Ticker.getHistory', {'size': size, 'concurrency': concurrency}, requests, getHistories
+
+
+def benchmarkPrices(concurrency, requests):
+
+    """Requesting the prices of many tickers, individually from concurrent threads and in batches."""
+
+    tickers = [Ticker(f'SYM{index}') for index in range(requests)]
+    symbols = [item.symbol for item in tickers]
+
+    def getPrice():
+        yahoo.clearCache()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda item: item.getPrice(), tickers))
+
+    yield 'Ticker.getPrice', {'concurrency': concurrency}, requests, getPrice
+    if concurrency == 1:
+        yield 'getPrices', {}, requests, lambda: ticker.getPrices(symbols, useCache=False)
+
+
+def measure(function, repeat):
+
+    """Returns the durations, in seconds, of running the function the given number of times, after a warm-up run."""
+
+    function()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run(sizes, concurrencies, requests, repeat):
+
+    """Runs all the benchmarks and returns their results."""
+
+    def getBenchmarks(directory):
+        yield from benchmarkLoadConverter(None, directory)
+        for size in sizes:
+            yield from benchmarkExchangeRates(size, directory)
+            yield from benchmarkOrders(size, directory)
+        for concurrency in concurrencies:
+            for size in sizes:
+                yield from benchmarkHistories(size, directory, concurrency, requests)
+            yield from benchmarkPrices(concurrency, requests)
+
+    results = []
+    settings = (currency.CURRENCY_CONVERTER, currency.CURRENCY_CACHE_DIRECTORY, yahoo.RATE_LIMIT, yahoo.POOL_SIZE)
+
+    with tempfile.TemporaryDirectory() as directory, StandInServer():
+        try:
+            currency.CURRENCY_CONVERTER = None
+            currency.CURRENCY_CACHE_DIRECTORY = directory
+            yahoo.configure(rateLimit=0, poolSize=max(concurrencies))
+            for name, parameters, operations, function in getBenchmarks(directory):
+                durations = measure(function, repeat)
+                result = {
+                    'name': name,
+                    'parameters': parameters,
+                    'operations': operations,
+                    'min': min(durations),
+                    'median': statistics.median(durations),
+                    'mean': statistics.mean(durations),
+                    'operationsPerSecond': operations / min(durations),
+                }
+                results.append(result)
+                print(_format(result), file=sys.stderr)
+        finally:
+            currency.CURRENCY_CONVERTER, currency.CURRENCY_CACHE_DIRECTORY = settings[:2]
+            yahoo.configure(rateLimit=settings[2], poolSize=settings[3])
+            yahoo.clearCache()
+            ticker.HISTORY_STORE.clear()
+
+    return results
+
+
+def compare(results, previousResults):
+
+    """Prints, for each benchmark also found in the previous results, the ratio of its median durations."""
+
+    getKey = lambda result: (result['name'], json.dumps(result['parameters'], sort_keys=True))
+    previous = {getKey(result): result for result in previousResults}
+    for result in results:
+        previousResult = previous.get(getKey(result))
+        if previousResult:
+            ratio = result['median'] / previousResult['median']
+            print(f'{_format(result)}  {ratio:6.2f}x previous median', file=sys.stderr)
+
+
+def _format(result):
+    parameters = ', '.join(f'{name}={value}' for name, value in result['parameters'].items())
+    return f'{result["name"]:<30} {parameters:<26} {result["median"] * 1e3:12.3f} ms {result["operationsPerSecond"]:14.1f} ops/s'
+
+
+def _getRevision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma-separated data sizes (lookups, orders or days of history).')
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated numbers of concurrent threads for requests.')
+    parser.add_argument('--requests', type=int, default=64, help='Number of tickers requested by each network benchmark.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each benchmark.')
+    parser.add_argument('--output', help='Path of the JSON file to write the results to (standard output by default).')
+    parser.add_argument('--compare', help='Path of the JSON results of a previous run to compare against.')
+    arguments = parser.parse_args(arguments)
+
+    results = run(
+        sizes=[int(size) for size in arguments.sizes.split(',')],
+        concurrencies=[int(concurrency) for concurrency in arguments.concurrency.split(',')],
+        requests=arguments.requests,
+        repeat=arguments.repeat
+    )
+    report = {
+        'revision': _getRevision(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            compare(results, json.load(file)['results'])
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
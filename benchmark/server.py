@@ -0,0 +1,140 @@
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import json
+import threading
+from urllib.parse import parse_qs, unquote, urlsplit
+from zipfile import ZipFile
+import numpy
+import currency
+import yahoo
+
+
+class StandInServer(object):
+
+    """
+    A local HTTP stand-in for Yahoo Finance and the ECB, serving synthetic payloads shaped as the
+    real ones: the zipped ECB table, chart histories and prices, searches and batch quotes.
+
+    Payloads are generated deterministically (from a seeded random walk), so that results are
+    comparable across runs; histories cover whatever interval is requested, with one value per
+    weekday.
+
+    Example
+    -------
+        >>> with StandInServer() as server:
+        ...     Ticker('YEET').getHistory(datetime.date(2021, 1, 1), datetime.date(2021, 12, 31))
+    """
+
+    CURRENCIES = ('USD', 'JPY', 'BGN', 'CZK', 'DKK', 'GBP', 'HUF', 'PLN', 'RON', 'SEK', 'CHF', 'ISK', 'NOK', 'TRY', 'AUD', 'BRL', 'CAD', 'CNY', 'HKD', 'IDR', 'ILS', 'INR', 'KRW', 'MXN', 'MYR', 'NZD', 'PHP', 'SGD', 'THB', 'ZAR')
+
+    def __init__(self, startDate=datetime.date(1999, 1, 4), endDate=None):
+        self.table = _createTable(startDate, endDate or datetime.date.today(), self.CURRENCIES)
+        self.requests = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.requests += 1
+                URL = urlsplit(self.path)
+                parameters = {name: values[0] for name, values in parse_qs(URL.query).items()}
+                if URL.path.endswith('.zip'):
+                    self._send(server.table, 'application/zip')
+                elif URL.path.startswith('/v8/finance/chart/'):
+                    symbol = unquote(URL.path[len('/v8/finance/chart/'):])
+                    self._sendJSON(_getChart(symbol, parameters))
+                elif URL.path == '/v1/finance/search':
+                    self._sendJSON({'quotes': [{'symbol': parameters.get('q', '')}]})
+                elif URL.path == '/v7/finance/quote':
+                    symbols = parameters.get('symbols', '').split(',')
+                    self._sendJSON({'quoteResponse': {'result': [_getQuote(symbol) for symbol in symbols if symbol]}})
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+
+            def _sendJSON(self, content):
+                self._send(json.dumps(content).encode(), 'application/json')
+
+            def _send(self, content, contentType):
+                self.send_response(200)
+                self.send_header('Content-Type', contentType)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpServer = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpServer.daemon_threads = True
+        self.URL = f'http://127.0.0.1:{self.httpServer.server_port}'
+        self._settings = None
+
+    def __enter__(self):
+
+        """Starts serving and points the yahoo and currency modules at the server."""
+
+        threading.Thread(target=self.httpServer.serve_forever, daemon=True).start()
+        self._settings = (yahoo.BASE_URL, currency.CURRENCY_TABLE_URL)
+        yahoo.BASE_URL = self.URL
+        currency.CURRENCY_TABLE_URL = f'{self.URL}/stats/eurofxref/eurofxref-hist.zip'
+        return self
+
+    def __exit__(self, *args):
+        yahoo.BASE_URL, currency.CURRENCY_TABLE_URL = self._settings
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
+
+
+def _createTable(startDate, endDate, currencies):
+
+    """Returns a zipped ECB table (latest date first) with a random walk of rates for each weekday."""
+
+    dates = numpy.arange(numpy.datetime64(startDate, 'D'), numpy.datetime64(endDate, 'D') + 1)
+    dates = dates[numpy.is_busday(dates)][::-1]
+    random = numpy.random.default_rng(0)
+    rates = numpy.exp(random.normal(0., .005, (len(dates), len(currencies))).cumsum(axis=0)) * random.uniform(.5, 100., len(currencies))
+
+    lines = ['Date,' + ','.join(currencies) + ',']
+    lines.extend(f'{date},' + ','.join(f'{rate:.4f}' for rate in row) + ',' for date, row in zip(dates.astype(str), rates))
+    content = BytesIO()
+    with ZipFile(content, 'w') as file:
+        file.writestr(currency.CURRENCY_FILE_NAME, '\n'.join(lines) + '\n')
+    return content.getvalue()
+
+
+def _getSeed(symbol):
+    return sum(map(ord, symbol))
+
+
+def _getChart(symbol, parameters):
+    meta = {'currency': 'USD', 'symbol': symbol, 'regularMarketPrice': 10. + _getSeed(symbol) % 90}
+    if 'period1' not in parameters:
+        return {'chart': {'result': [{'meta': meta}]}}
+
+    # One value per weekday, at noon UTC, from a random walk seeded by the symbol;
+    days = numpy.arange(int(parameters['period1']) // 86400, int(parameters['period2']) // 86400)
+    days = days[numpy.is_busday(days.astype('datetime64[D]'))]
+    random = numpy.random.default_rng(_getSeed(symbol))
+    closes = meta['regularMarketPrice'] * numpy.exp(random.normal(0., .01, len(days)).cumsum())
+    return {'chart': {'result': [{
+        'meta': meta,
+        'timestamp': (days * 86400 + 43200).tolist(),
+        'indicators': {'quote': [{
+            'open': closes.round(4).tolist(),
+            'high': (closes * 1.01).round(4).tolist(),
+            'low': (closes * .99).round(4).tolist(),
+            'close': closes.round(4).tolist(),
+            'volume': (days % 1000 * 100).tolist(),
+        }]},
+    }]}}
+
+
+def _getQuote(symbol):
+    return {'symbol': symbol, 'currency': 'USD', 'regularMarketPrice': 10. + _getSeed(symbol) % 90, 'marketState': 'REGULAR'}
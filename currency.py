@@ -1,17 +1,43 @@
-from datetime import datetime
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from io import BytesIO
+import json
+import os
+import tempfile
+import threading
+import time
+from xml.etree import ElementTree
 from zipfile import ZipFile
-from urllib.request import urlopen
-from pandas import read_csv
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+import warnings
+import numpy
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 CURRENCY_TABLE_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist.zip'
 CURRENCY_FILE_NAME = 'eurofxref-hist.csv'
+CURRENCY_DAILY_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml'
+CURRENCY_90_DAYS_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-hist-90d.xml'
 DATE_COLUMN_NAME = 'Date'
 CURRENCY_CONVERTER = None
+CURRENCY_CACHE_DIRECTORY = os.environ.get('PYNANCE_CACHE_DIRECTORY', os.path.join(os.path.expanduser('~'), '.cache', 'pynance'))
+CURRENCY_CACHE_TTL = timedelta(hours=6)
+
+
+BatchConversion = namedtuple('BatchConversion', ['values', 'missing'])
+BatchConversion.__doc__ = """
+The result of a batch conversion: the converted values, alongside a boolean mask flagging the
+elements for which no exchange rate was available (whose value is NaN).
+"""
 
 
-def getExchangeRate(baseCurrency: str, targetCurrency: str, date: datetime.date=None) -> float:
+def getExchangeRate(baseCurrency: str, targetCurrency: str, date: datetime.date=None, asOf: bool=False, maxStaleness: timedelta=None) -> float:
 
     """
     Given two currencies, it returns the exchange rate between the two,
@@ -22,6 +48,13 @@ def getExchangeRate(baseCurrency: str, targetCurrency: str, date: datetime.date=
         baseCurrency: str
         targetCurrency: str
         date: datetime.date
+        asOf: bool
+            If set, rather than requiring a rate on the exact date, the most recent
+            rate on or before it is used (e.g. the previous business day for weekends
+            and ECB holidays).
+        maxStaleness: datetime.timedelta
+            Only relevant with 'asOf'; how far back from the requested date the rate
+            used may be, with no limit if not provided.
 
     Return
     ------
@@ -33,26 +66,276 @@ def getExchangeRate(baseCurrency: str, targetCurrency: str, date: datetime.date=
         0.420
         >>> getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 7))
         0.69
+        >>> getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 8), asOf=True)
+        0.69
+    """
+
+    return _getCurrencyConverter().getExchangeRate(baseCurrency, targetCurrency, date=date, asOf=asOf, maxStaleness=maxStaleness)
+
+
+def getExchangeRates(baseCurrencies, targetCurrencies, dates=None, asOf: bool=False, maxStaleness: timedelta=None):
+
+    """
+    Vectorized counterpart of getExchangeRate, returning NaN wherever no exchange rate is available
+    rather than raising.
+
+    With 'asOf' set, it aligns a whole series of dates (e.g. the dates of a ticker's history) to the
+    most recent exchange rate on or before each of them in a single merge against the ECB dates.
+
+    Parameters
+    ----------
+        baseCurrencies: array-like[str] | str
+        targetCurrencies: array-like[str] | str
+        dates: array-like[datetime.date]
+        asOf: bool
+        maxStaleness: datetime.timedelta
+
+    Return
+    ------
+        numpy.ndarray[float]
+
+    Example
+    -------
+        >>> getExchangeRates('USD', 'GBP', [datetime.date(2010, 5, 7), datetime.date(2010, 5, 8)], asOf=True)
+        array([0.68, 0.68])
+    """
+
+    return _getCurrencyConverter().getExchangeRates(baseCurrencies, targetCurrencies, dates=dates, asOf=asOf, maxStaleness=maxStaleness)
+
+
+def convertBatch(values, baseCurrencies, targetCurrency: str, dates=None, asOf: bool=False, maxStaleness: timedelta=None) -> BatchConversion:
+
     """
+    Given arrays of values, of the currencies they are expressed in and, optionally, of the dates
+    for which they should be converted, it converts all of them into the target currency in a
+    single vectorized pass over the exchange rates.
+
+    Elements for which no exchange rate is available (unknown currency or no rate on that date) do
+    not fail the batch; their converted value is NaN and they are flagged in the returned mask.
+
+    Parameters
+    ----------
+        values: array-like[float]
+        baseCurrencies: array-like[str] | str
+        targetCurrency: str
+        dates: array-like[datetime.date]
+        asOf: bool
+        maxStaleness: datetime.timedelta
+            See getExchangeRate.
 
-    return _getCurrencyConverter().getExchangeRate(baseCurrency, targetCurrency, date=date)
+    Return
+    ------
+        BatchConversion
+
+    Example
+    -------
+        >>> convertBatch([1., 2.], ['USD', 'YEET'], 'GBP', dates=[datetime.date(2010, 5, 7)] * 2)
+        BatchConversion(values=array([0.68, nan]), missing=array([False, True]))
+    """
+
+    rates = _getCurrencyConverter().getExchangeRates(baseCurrencies, targetCurrency, dates=dates, asOf=asOf, maxStaleness=maxStaleness)
+    return BatchConversion(numpy.asarray(values, dtype=float) * rates, numpy.isnan(rates))
+
+
+def refreshExchangeRates() -> int:
+
+    """
+    Brings the global currency converter up to date by appending the dates it is missing, fetched
+    from the small ECB daily feed (or the 90 days one, if more than a day behind), rather than
+    downloading the full history again; the on-disk cache is updated alongside it.
+
+    The converter is swapped atomically: callers holding, or concurrently retrieving, the global
+    converter see either the previous or the updated table, never a partially updated one.
+
+    Return
+    ------
+        int
+            The number of dates appended.
+
+    Example
+    -------
+        >>> refreshExchangeRates()
+        1
+    """
+
+    global CURRENCY_CONVERTER
+
+    with _CONVERTER_LOCK:
+
+        converter = _getCurrencyConverter()
+        behind = numpy.datetime64(datetime.now().date(), 'D') - converter.dates[-1]
+        if behind > numpy.timedelta64(90, 'D'):
+            updatedConverter = _CurrencyConverter.load(ttl=timedelta(0))
+        else:
+            URL = CURRENCY_DAILY_URL if behind <= numpy.timedelta64(1, 'D') else CURRENCY_90_DAYS_URL
+            updatedConverter = converter.extend(_parseFeed(urlopen(URL).read()))
+
+        if updatedConverter is not converter:
+            if CURRENCY_CACHE_DIRECTORY:
+                _CurrencyCache(CURRENCY_CACHE_DIRECTORY).update(updatedConverter)
+            CURRENCY_CONVERTER = updatedConverter
+
+        return len(updatedConverter.dates) - len(converter.dates)
+
+
+def warmUp() -> threading.Thread:
+
+    """
+    Starts loading the global currency converter in a background thread, so that it is ready by
+    the time the first conversion is requested; a conversion requested while loading is still
+    underway waits for it rather than starting another one. Nothing is loaded until either this
+    or a conversion is called.
+
+    Return
+    ------
+        threading.Thread
+            The (daemon) thread loading the converter.
+
+    Example
+    -------
+        >>> warmUp()
+        <Thread(pynance-currency-warm-up, started daemon 123145)>
+    """
+
+    def load():
+        try:
+            _getCurrencyConverter()
+        except Exception as exception:
+            warnings.warn(f'The currency converter could not be warmed up ({exception}); it will be loaded on first use.')
+
+    thread = threading.Thread(target=load, name='pynance-currency-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+_CONVERTER_LOCK = threading.RLock()
 
 
 def _getCurrencyConverter():
     global CURRENCY_CONVERTER
     if not CURRENCY_CONVERTER:
-        CURRENCY_CONVERTER = _CurrencyConverter.download()
+        with _CONVERTER_LOCK:
+            if not CURRENCY_CONVERTER:
+                CURRENCY_CONVERTER = _CurrencyConverter.load()
     return CURRENCY_CONVERTER
 
 
+def _parseTable(content):
+    from pandas import read_csv
+    file = ZipFile(BytesIO(content))
+    table = read_csv(file.open(CURRENCY_FILE_NAME))
+    table = table.drop(columns=[column for column in table.columns if column.startswith('Unnamed')])
+    table['EUR'] = 1.
+    return table
+
+
+def _parseFeed(content):
+
+    """Parses an ECB XML feed (daily or 90 days) into a list of dates and their rates by currency."""
+
+    entries = []
+    for cube in ElementTree.fromstring(content).iter():
+        if cube.tag.endswith('Cube') and 'time' in cube.attrib:
+            rates = {rate.attrib['currency']: float(rate.attrib['rate']) for rate in cube if 'currency' in rate.attrib}
+            entries.append((numpy.datetime64(cube.attrib['time'], 'D'), rates))
+    return entries
+
+
 class _CurrencyConverter(object):
 
     @staticmethod
     def download():
-        file = ZipFile(BytesIO(urlopen(CURRENCY_TABLE_URL).read()))
-        table = read_csv(file.open(CURRENCY_FILE_NAME))
-        table['EUR'] = 1.
-        return _CurrencyConverter(table)
+        return _CurrencyConverter(_parseTable(urlopen(CURRENCY_TABLE_URL).read()))
+
+    @staticmethod
+    def load(directory=None, ttl=None):
+
+        """
+        Loads the converter from the table cached on disk, refreshing the cache only when it is
+        older than the given time-to-live; the refresh is a conditional request (ETag and
+        Last-Modified), so an unchanged table is not downloaded again. If the refresh fails, a
+        stale cache is used rather than failing.
+
+        The cache can be shared by several processes: readers and the (single) refreshing process
+        are serialised by a file lock and files are replaced atomically.
+
+        Parameters
+        ----------
+            directory: str
+                Defaults to CURRENCY_CACHE_DIRECTORY; if neither is set, the table is downloaded.
+            ttl: datetime.timedelta
+                Defaults to CURRENCY_CACHE_TTL.
+
+        Return
+        ------
+            _CurrencyConverter
+        """
+
+        directory = directory or CURRENCY_CACHE_DIRECTORY
+        if not directory:
+            return _CurrencyConverter.download()
+
+        cache = _CurrencyCache(directory)
+        ttl = CURRENCY_CACHE_TTL if ttl is None else ttl
+
+        with cache.lock(exclusive=False):
+            if cache.isFresh(ttl):
+                return cache.read()
+
+        with cache.lock(exclusive=True):
+
+            # Another process may have refreshed the cache while waiting for the lock;
+            metadata = cache.readMetadata()
+            if cache.isFresh(ttl):
+                return cache.read()
+
+            headers = {}
+            if metadata.get('etag'):
+                headers['If-None-Match'] = metadata['etag']
+            if metadata.get('lastModified'):
+                headers['If-Modified-Since'] = metadata['lastModified']
+
+            try:
+                with urlopen(Request(CURRENCY_TABLE_URL, headers=headers)) as response:
+                    converter = _CurrencyConverter(_parseTable(response.read()))
+                    cache.write(converter, etag=response.headers.get('ETag'), lastModified=response.headers.get('Last-Modified'))
+                    return converter
+            except HTTPError as error:
+                if not metadata:
+                    raise
+                if error.code == 304:
+                    cache.writeMetadata(dict(metadata, fetched=time.time()))
+                else:
+                    warnings.warn(f'The ECB exchange rates could not be refreshed (HTTP {error.code}); stale cached rates are used instead.')
+            except (URLError, OSError):
+                if not metadata:
+                    raise
+                warnings.warn('The ECB exchange rates could not be refreshed; stale cached rates are used instead.')
+
+            return cache.read()
+
+    @staticmethod
+    def fromArrays(dates, currencies, rates):
+
+        """
+        Initialises the converter directly from its date-sorted rate matrix, without a table.
+
+        Parameters
+        ----------
+            dates: numpy.ndarray[datetime64[D]]
+            currencies: list[str]
+                The currency for each column of the rates.
+            rates: numpy.ndarray[float]
+
+        Return
+        ------
+            _CurrencyConverter
+        """
+
+        converter = _CurrencyConverter.__new__(_CurrencyConverter)
+        converter._table = None
+        converter._setRates(dates, currencies, rates)
+        return converter
 
     def __init__(self, table):
 
@@ -60,36 +343,317 @@ class _CurrencyConverter(object):
         Initialises the currency conversion converter given a conversion
         table.
 
+        The table is indexed once, at construction, into a date-sorted rate
+        matrix (dates x currencies) and a mapping from currency to column, so
+        that each lookup is a binary search on the dates followed by an array
+        access.
+
         Parameters
         ----------
             table: pandas.DataFrame
                 A table mapping the relative value of currencies by date.
         """
 
-        self.table = table
+        currencies = [column for column in table.columns if column != DATE_COLUMN_NAME]
+        dates = numpy.array(table[DATE_COLUMN_NAME], dtype='datetime64[D]')
+        order = numpy.argsort(dates, kind='stable')
+
+        self._table = table
+        self._setRates(dates[order], currencies, table[currencies].to_numpy(dtype=float, na_value=numpy.nan)[order])
+
+    @property
+    def table(self):
+
+        """The table mapping the relative value of currencies by date, built on demand if the converter was not initialised from one."""
+
+        if self._table is None:
+            from pandas import DataFrame
+            self._table = DataFrame(self.rates, columns=self.currencies)
+            self._table.insert(0, DATE_COLUMN_NAME, numpy.datetime_as_string(self.dates, unit='D'))
+        return self._table
+
+    def _setRates(self, dates, currencies, rates, lastRows=None):
+
+        self.dates = dates
+        self.rates = rates
+        self.currencies = list(currencies)
+        self.currencyIndex = {currency: index for index, currency in enumerate(self.currencies)}
+
+        # For each date and currency, the row of the most recent rate available on or before it,
+        # or -1 if there is none, used by as-of lookups;
+        if lastRows is None:
+            lastRows = self._getLastRows(rates, 0, numpy.full(len(self.currencies), -1))
+        self.lastRows = lastRows
+
+    @staticmethod
+    def _getLastRows(rates, firstRow, previousLastRows):
+        rows = numpy.arange(firstRow, firstRow + len(rates))[:, None]
+        lastRows = numpy.where(numpy.isnan(rates), -1, rows)
+        return numpy.maximum.accumulate(numpy.vstack([previousLastRows[None, :], lastRows]), axis=0)[1:]
+
+    def extend(self, entries):
+
+        """
+        Returns a new converter with the given entries appended, ignoring those for dates the
+        converter already holds; the existing rates are not re-indexed, and this converter is left
+        untouched, so that it can keep being used while the new one is built.
+
+        Parameters
+        ----------
+            entries: list[tuple[numpy.datetime64, dict[str, float]]]
+                The rates for each date, by currency, relative to the Euro.
+
+        Return
+        ------
+            _CurrencyConverter
+        """
+
+        entries = sorted({date: rates for date, rates in entries if not len(self.dates) or date > self.dates[-1]}.items(), key=lambda entry: entry[0])
+        if not entries:
+            return self
+
+        # Currencies never seen before are added as new columns, without rates for past dates;
+        currencies = list(self.currencies)
+        for _, rates in entries:
+            currencies.extend(currency for currency in rates if currency not in currencies and currency not in self.currencyIndex)
+        if 'EUR' not in currencies:
+            currencies.append('EUR')
+        currencyIndex = {currency: index for index, currency in enumerate(currencies)}
+
+        newRates = numpy.full((len(entries), len(currencies)), numpy.nan)
+        for row, (_, rates) in enumerate(entries):
+            for currency, rate in dict(rates, EUR=1.).items():
+                newRates[row, currencyIndex[currency]] = rate
+
+        addedColumns = len(currencies) - len(self.currencies)
+        oldRates = numpy.pad(self.rates, ((0, 0), (0, addedColumns)), constant_values=numpy.nan) if addedColumns else self.rates
+        oldLastRows = numpy.pad(self.lastRows, ((0, 0), (0, addedColumns)), constant_values=-1) if addedColumns else self.lastRows
+        previousLastRows = oldLastRows[-1] if len(oldLastRows) else numpy.full(len(currencies), -1)
+
+        converter = _CurrencyConverter.__new__(_CurrencyConverter)
+        converter._table = None
+        converter._setRates(
+            numpy.concatenate([self.dates, numpy.array([date for date, _ in entries], dtype='datetime64[D]')]),
+            currencies,
+            numpy.vstack([oldRates, newRates]),
+            numpy.vstack([oldLastRows, self._getLastRows(newRates, len(self.dates), previousLastRows)])
+        )
+        return converter
 
     def getAvailableCurrencies(self):
-        return set(self.table.columns) - {'Date',}
+        return set(self.currencyIndex)
 
-    def getExchangeRate(self, baseCurrency: str, targetCurrency: str, date: datetime.date=None) -> float:
+    def getExchangeRate(self, baseCurrency: str, targetCurrency: str, date: datetime.date=None, asOf: bool=False, maxStaleness: timedelta=None) -> float:
 
-        # Ensure the teo provided currencies are valid;
+        # Ensure the two provided currencies are valid;
         for currency in (baseCurrency, targetCurrency):
-            if currency not in self.getAvailableCurrencies():
+            if currency not in self.currencyIndex:
                 raise RuntimeError('Unknown currency %s.', currency)
+        baseColumn, targetColumn = self.currencyIndex[baseCurrency], self.currencyIndex[targetCurrency]
 
-        # Extract the records for the two currencies;
-        table = self.table[[baseCurrency, targetCurrency, DATE_COLUMN_NAME]]
-        table = table.sort_values(DATE_COLUMN_NAME)
-
-        # Determine for which date the conversion must be made and ensure it's valid;
-        date = date.strftime('%Y-%m-%d') if date else table.iloc[-1][DATE_COLUMN_NAME]
-        table = table[table[DATE_COLUMN_NAME] == date].dropna()
-        if len(table) != 1:
+        # Determine for which row the conversion must be made and ensure it's valid;
+        row = self._getRow(date, asOf=asOf) if date else len(self.dates) - 1
+        if row is not None and asOf:
+            row = self._getCommonRow(row, baseColumn, targetColumn)
+        if row is None or row < 0:
             raise RuntimeError('No exchange rate could be found for %s and %s on date %s.', baseCurrency, targetCurrency, date)
+        if date and asOf and maxStaleness is not None and numpy.datetime64(date, 'D') - self.dates[row] > maxStaleness:
+            raise RuntimeError('The latest exchange rate for %s and %s on date %s is too stale (%s).', baseCurrency, targetCurrency, date, self.dates[row])
 
         # Determine the exchange rate;
-        entry = table.iloc[0]
-        exchangeRate = entry[targetCurrency] / entry[baseCurrency]
+        baseRate = self.rates[row, baseColumn]
+        targetRate = self.rates[row, targetColumn]
+        if numpy.isnan(baseRate) or numpy.isnan(targetRate):
+            raise RuntimeError('No exchange rate could be found for %s and %s on date %s.', baseCurrency, targetCurrency, self.dates[row])
+
+        return float(targetRate / baseRate)
+
+    def _getRow(self, date, asOf=False):
+
+        """
+        Returns the row of the rate matrix for the given date, or None if there is no entry for it;
+        if 'asOf' is set, the row of the latest date on or before the given one is returned instead.
+        """
+
+        date = numpy.datetime64(date, 'D')
+        if asOf:
+            row = numpy.searchsorted(self.dates, date, side='right') - 1
+            return int(row) if row >= 0 else None
+        row = numpy.searchsorted(self.dates, date)
+        if row == len(self.dates) or self.dates[row] != date:
+            return None
+        return int(row)
+
+    def _getCommonRow(self, row, baseColumn, targetColumn):
+
+        """Returns the latest row, on or before the given one, where both currencies have a rate."""
+
+        while row >= 0:
+            commonRow = min(self.lastRows[row, baseColumn], self.lastRows[row, targetColumn])
+            if commonRow == row:
+                break
+            row = commonRow
+        return int(row)
+
+    def getExchangeRates(self, baseCurrencies, targetCurrencies, dates=None, asOf: bool=False, maxStaleness: timedelta=None):
+
+        """
+        Vectorized counterpart of getExchangeRate: currencies and dates are given as arrays (or
+        scalars, which are broadcast) and the exchange rates are returned as an array, with NaN
+        wherever no rate is available rather than raising.
+
+        Parameters
+        ----------
+            baseCurrencies: array-like[str] | str
+            targetCurrencies: array-like[str] | str
+            dates: array-like[datetime.date]
+            asOf: bool
+            maxStaleness: datetime.timedelta
+
+        Return
+        ------
+            numpy.ndarray[float]
+        """
+
+        baseColumns = self._getColumns(baseCurrencies)
+        targetColumns = self._getColumns(targetCurrencies)
+        rows = self._getRows(dates, asOf=asOf) if dates is not None else numpy.array(len(self.dates) - 1)
+        rows, baseColumns, targetColumns = numpy.broadcast_arrays(rows, baseColumns, targetColumns)
+
+        rates = numpy.full(rows.shape, numpy.nan)
+        valid = (rows >= 0) & (baseColumns >= 0) & (targetColumns >= 0)
+        rows, baseColumns, targetColumns = rows[valid], baseColumns[valid], targetColumns[valid]
+
+        if asOf:
+            rows = self._getCommonRows(rows, baseColumns, targetColumns)
+            if dates is not None and maxStaleness is not None:
+                requestedDates = numpy.broadcast_to(numpy.asarray(dates, dtype='datetime64[D]'), valid.shape)[valid]
+                stale = (rows < 0) | (requestedDates - self.dates[rows] > maxStaleness)
+                rows = numpy.where(stale, -1, rows)
+            found = rows >= 0
+            valid[valid] = found
+            rows, baseColumns, targetColumns = rows[found], baseColumns[found], targetColumns[found]
+
+        rates[valid] = self.rates[rows, targetColumns] / self.rates[rows, baseColumns]
+
+        return rates
+
+    def _getColumns(self, currencies):
+
+        """Returns the columns of the rate matrix for the given currencies, with -1 for unknown ones."""
+
+        currencies = numpy.asarray(currencies, dtype=object)
+        uniqueCurrencies, inverse = numpy.unique(currencies, return_inverse=True)
+        columns = numpy.array([self.currencyIndex.get(currency, -1) for currency in uniqueCurrencies], dtype=int)
+        return columns[inverse].reshape(currencies.shape)
+
+    def _getRows(self, dates, asOf=False):
+
+        """
+        Returns the rows of the rate matrix for the given dates, with -1 for dates without an entry;
+        if 'asOf' is set, the rows of the latest dates on or before the given ones are returned instead.
+        """
+
+        dates = numpy.asarray(dates, dtype='datetime64[D]')
+        if asOf:
+            return numpy.where(numpy.isnat(dates), -1, numpy.searchsorted(self.dates, dates, side='right') - 1)
+        rows = numpy.searchsorted(self.dates, dates).clip(max=max(len(self.dates) - 1, 0))
+        return numpy.where(self.dates[rows] == dates, rows, -1)
+
+    def _getCommonRows(self, rows, baseColumns, targetColumns):
+
+        """Vectorized counterpart of _getCommonRow, returning -1 where no common row exists."""
+
+        rows = rows.copy()
+        pending = rows >= 0
+        while pending.any():
+            commonRows = numpy.minimum(
+                self.lastRows[rows[pending], baseColumns[pending]],
+                self.lastRows[rows[pending], targetColumns[pending]]
+            )
+            changed = commonRows != rows[pending]
+            rows[pending] = commonRows
+            pending[pending] = changed & (commonRows >= 0)
+        return rows
+
+
+class _CurrencyCache(object):
+
+    """
+    The on-disk cache of the ECB table: the dates and rate matrix are stored as NumPy files, which
+    are memory-mapped when read, alongside a JSON metadata file holding the currencies and the HTTP
+    validators of the download.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.datesPath = os.path.join(directory, 'ecb-dates.npy')
+        self.ratesPath = os.path.join(directory, 'ecb-rates.npy')
+        self.metadataPath = os.path.join(directory, 'ecb.json')
+        self.lockPath = os.path.join(directory, 'ecb.lock')
+
+    @contextmanager
+    def lock(self, exclusive):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lockPath, 'a') as file:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def readMetadata(self):
+        try:
+            with open(self.metadataPath, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def isFresh(self, ttl):
+        metadata = self.readMetadata()
+        return bool(metadata) and time.time() - metadata.get('fetched', 0) < ttl.total_seconds()
+
+    def read(self):
+        metadata = self.readMetadata()
+        dates = numpy.load(self.datesPath, mmap_mode='r')
+        rates = numpy.load(self.ratesPath, mmap_mode='r')
+        return _CurrencyConverter.fromArrays(dates, metadata['currencies'], rates)
+
+    def write(self, converter, etag=None, lastModified=None):
+        _replaceFile(self.datesPath, lambda file: numpy.save(file, converter.dates))
+        _replaceFile(self.ratesPath, lambda file: numpy.save(file, converter.rates))
+        self.writeMetadata({'currencies': converter.currencies, 'etag': etag, 'lastModified': lastModified, 'fetched': time.time()})
+
+    def update(self, converter):
+
+        """Writes the given converter unless the cache already holds more recent rates (e.g. written by another process)."""
+
+        with self.lock(exclusive=True):
+            metadata = self.readMetadata()
+            if metadata:
+                cachedDates = numpy.load(self.datesPath, mmap_mode='r')
+                if len(cachedDates) and cachedDates[-1] >= converter.dates[-1]:
+                    return
+            self.write(converter, etag=metadata.get('etag'), lastModified=metadata.get('lastModified'))
+
+    def writeMetadata(self, metadata):
+        _replaceFile(self.metadataPath, lambda file: file.write(json.dumps(metadata).encode()))
+
+
+def _replaceFile(path, write):
+
+    """
+    Writes a file through a temporary one, next to it, which then atomically replaces it, so
+    readers never see it partially written and files memory-mapped from it remain valid.
+    """
 
-        return exchangeRate
\ No newline at end of file
+    file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', suffix='.tmp', delete=False)
+    try:
+        with file:
+            write(file)
+        os.replace(file.name, path)
+    except BaseException:
+        os.remove(file.name)
+        raise
@@ -0,0 +1,302 @@
+from collections import OrderedDict
+import datetime
+import glob
+import json
+import os
+import threading
+from urllib.parse import quote, unquote
+import numpy
+from currency import _replaceFile
+
+
+class HistoryStore(object):
+
+    """
+    Stores the daily histories of tickers by symbol, alongside the date ranges each of them covers,
+    so that a request for a date range only needs to fetch the parts (gaps) which are not already
+    held; adjacent and overlapping ranges are merged as they are added.
+
+    Histories are held as columns of NumPy arrays sorted by date: 'date' (datetime64[D]) and one
+    column per field (e.g. 'close').
+
+    The number of dates held across all symbols can be bounded: beyond it, the histories of the
+    least recently used symbols are evicted (alongside their ranges, so they are requested again).
+    """
+
+    def __init__(self, maxSize=None):
+        """
+        Parameters
+        ----------
+            maxSize: int
+                The maximum number of dates held across all symbols, unbounded if not set.
+        """
+        self.maxSize = maxSize
+        self._lock = threading.RLock()
+        self._currencies = {}
+        self._histories = {}
+        self._ranges = {}
+        self._sizes = OrderedDict()
+        self._size = 0
+
+    def clear(self):
+        with self._lock:
+            self._currencies.clear()
+            self._histories.clear()
+            self._ranges.clear()
+            self._sizes.clear()
+            self._size = 0
+
+    def getRanges(self, symbol):
+
+        """
+        Returns the (inclusive) date ranges held for the given symbol, sorted and merged.
+
+        Return
+        ------
+            list[tuple[datetime.date, datetime.date]]
+        """
+
+        with self._lock:
+            self._touch(symbol)
+            return list(self._ranges.get(symbol, []))
+
+    def getMissingRanges(self, symbol, startDate, endDate):
+
+        """
+        Returns the (inclusive) date ranges within the given one which are not held for the symbol.
+
+        Parameters
+        ----------
+            symbol: str
+            startDate: datetime.date
+            endDate: datetime.date
+
+        Return
+        ------
+            list[tuple[datetime.date, datetime.date]]
+        """
+
+        day = datetime.timedelta(days=1)
+        missingRanges = []
+        cursor = startDate
+
+        for rangeStart, rangeEnd in self.getRanges(symbol):
+            if rangeEnd < cursor:
+                continue
+            if rangeStart > endDate:
+                break
+            if rangeStart > cursor:
+                missingRanges.append((cursor, rangeStart - day))
+            cursor = max(cursor, rangeEnd + day)
+
+        if cursor <= endDate:
+            missingRanges.append((cursor, endDate))
+
+        return missingRanges
+
+    def add(self, symbol, currency, history, startDate=None, endDate=None):
+
+        """
+        Adds the history of a symbol, replacing any held values for the same dates, and records the
+        given (inclusive) date range as held, if provided.
+
+        Parameters
+        ----------
+            symbol: str
+            currency: str
+            history: dict[str: numpy.ndarray]
+            startDate: datetime.date
+            endDate: datetime.date
+        """
+
+        with self._lock:
+
+            held = self._histories.get(symbol)
+            if held is not None:
+                kept = ~numpy.isin(held['date'], history['date'])
+                fields = set(held) & set(history)
+                history = {field: numpy.concatenate([held[field][kept], history[field]]) for field in fields}
+            order = numpy.argsort(history['date'], kind='stable')
+
+            self._currencies[symbol] = currency
+            self._histories[symbol] = {field: values[order] for field, values in history.items()}
+
+            if startDate is not None and endDate is not None and startDate <= endDate:
+                self._addRange(symbol, startDate, endDate)
+
+            self._track(symbol)
+
+    def getPreviousValue(self, symbol, date, field='close'):
+
+        """
+        Returns the latest value of a field held for a symbol strictly before the given date, if any.
+
+        Parameters
+        ----------
+            symbol: str
+            date: datetime.date
+            field: str
+
+        Return
+        ------
+            float | None
+        """
+
+        with self._lock:
+            history = self._histories.get(symbol)
+            if history is None or field not in history:
+                return None
+            self._touch(symbol)
+            row = numpy.searchsorted(history['date'], numpy.datetime64(date, 'D'), side='left') - 1
+            return float(history[field][row]) if row >= 0 else None
+
+    def _addRange(self, symbol, startDate, endDate):
+        day = datetime.timedelta(days=1)
+        ranges = []
+        for rangeStart, rangeEnd in sorted(self._ranges.get(symbol, []) + [(startDate, endDate)]):
+            if ranges and rangeStart <= ranges[-1][1] + day:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], rangeEnd))
+            else:
+                ranges.append((rangeStart, rangeEnd))
+        self._ranges[symbol] = ranges
+
+    def get(self, symbol, startDate, endDate):
+
+        """
+        Returns the currency and the held history of a symbol within the given (inclusive) dates.
+
+        Parameters
+        ----------
+            symbol: str
+            startDate: datetime.date
+            endDate: datetime.date
+
+        Return
+        ------
+            tuple[str, dict[str: numpy.ndarray]]
+
+        Raise
+        -----
+            KeyError
+                If no history is held for the symbol.
+        """
+
+        with self._lock:
+            history = self._histories[symbol]
+            self._touch(symbol)
+            first = numpy.searchsorted(history['date'], numpy.datetime64(startDate, 'D'), side='left')
+            last = numpy.searchsorted(history['date'], numpy.datetime64(endDate, 'D'), side='right')
+            return self._currencies[symbol], {field: values[first:last] for field, values in history.items()}
+
+    def _touch(self, symbol):
+        if symbol in self._sizes:
+            self._sizes.move_to_end(symbol)
+
+    def _track(self, symbol):
+
+        """Records the number of dates held for a symbol, as the most recently used, and evicts others beyond the maximum size."""
+
+        self._size += len(self._histories[symbol]['date']) - self._sizes.pop(symbol, 0)
+        self._sizes[symbol] = len(self._histories[symbol]['date'])
+        while self.maxSize is not None and self._size > self.maxSize and len(self._sizes) > 1:
+            evicted = next(iter(self._sizes))
+            self._size -= self._sizes.pop(evicted)
+            self._forget(evicted)
+
+    def _forget(self, symbol):
+        self._currencies.pop(symbol, None)
+        self._histories.pop(symbol, None)
+        self._ranges.pop(symbol, None)
+
+
+class DiskHistoryStore(HistoryStore):
+
+    """
+    A HistoryStore persisted to a directory, partitioned by symbol: the history of each symbol is
+    held in a NumPy file of records (one field per column), memory-mapped when read, alongside a
+    JSON file holding its currency and the date ranges it covers.
+
+    Partitions are loaded lazily, the first time a symbol is accessed, and rewritten whenever its
+    history is added to; as the ranges are written after the history, an interrupted write never
+    records a range as held without its values. Evicted symbols are only dropped from memory, to be
+    loaded from disk again when next accessed.
+    """
+
+    def __init__(self, directory, maxSize=None):
+        super().__init__(maxSize)
+        self.directory = directory
+        self._loaded = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def clear(self):
+
+        """Removes all the held histories, including those on disk."""
+
+        with self._lock:
+            for metadataPath in glob.glob(os.path.join(self.directory, '*.json')):
+                for path in (metadataPath, metadataPath[:-len('.json')] + '.npy'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._loaded.clear()
+            super().clear()
+
+    def getSymbols(self):
+
+        """Returns the symbols whose history is held on disk."""
+
+        return sorted(unquote(os.path.basename(path)[:-len('.json')]) for path in glob.glob(os.path.join(self.directory, '*.json')))
+
+    def getRanges(self, symbol):
+        with self._lock:
+            self._load(symbol)
+            return super().getRanges(symbol)
+
+    def add(self, symbol, currency, history, startDate=None, endDate=None):
+        with self._lock:
+            self._load(symbol)
+            super().add(symbol, currency, history, startDate, endDate)
+            self._write(symbol)
+
+    def get(self, symbol, startDate, endDate):
+        with self._lock:
+            self._load(symbol)
+            return super().get(symbol, startDate, endDate)
+
+    def getPreviousValue(self, symbol, date, field='close'):
+        with self._lock:
+            self._load(symbol)
+            return super().getPreviousValue(symbol, date, field)
+
+    def _getPaths(self, symbol):
+        path = os.path.join(self.directory, quote(symbol, safe=''))
+        return path + '.npy', path + '.json'
+
+    def _load(self, symbol):
+        if symbol in self._loaded:
+            return
+        self._loaded.add(symbol)
+        historyPath, metadataPath = self._getPaths(symbol)
+        try:
+            with open(metadataPath, 'r') as file:
+                metadata = json.load(file)
+            records = numpy.load(historyPath, mmap_mode='r')
+        except (OSError, ValueError):
+            return
+        self._currencies[symbol] = metadata['currency']
+        self._histories[symbol] = {field: records[field] for field in records.dtype.names}
+        self._ranges[symbol] = [tuple(map(datetime.date.fromisoformat, dateRange)) for dateRange in metadata['ranges']]
+        self._track(symbol)
+
+    def _forget(self, symbol):
+        super()._forget(symbol)
+        self._loaded.discard(symbol)
+
+    def _write(self, symbol):
+        historyPath, metadataPath = self._getPaths(symbol)
+        history = self._histories[symbol]
+        records = numpy.empty(len(history['date']), dtype=[(field, values.dtype) for field, values in history.items()])
+        for field, values in history.items():
+            records[field] = values
+        metadata = {'currency': self._currencies[symbol], 'ranges': [[rangeStart.isoformat(), rangeEnd.isoformat()] for rangeStart, rangeEnd in self._ranges.get(symbol, [])]}
+        _replaceFile(historyPath, lambda file: numpy.save(file, records))
+        _replaceFile(metadataPath, lambda file: file.write(json.dumps(metadata).encode()))
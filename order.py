@@ -1,6 +1,11 @@
 
+from collections import Counter
 from enum import Enum
 import json
+import os
+import re
+import numpy
+from currency import _replaceFile, convertBatch
 from price import Price
 import datetime
 from ticker import Ticker
@@ -14,19 +19,66 @@ class OrderDirection(Enum):
 
 class Order(object):
 
+    """An order to buy or sell a ticker; orders are immutable and their hash is computed once, when first needed."""
+
+    __slots__ = ('symbol', 'direction', 'quantity', 'price', 'date', 'fee', '_hash')
+
     def __init__(self, symbol, direction, quantity, price, date, fee=None):
-        self.symbol = symbol
-        self.direction = direction
-        self.quantity = quantity
-        self.price = price
-        self.fee = fee
-        self.date = date        
+        _setSymbol(self, symbol)
+        _setDirection(self, direction)
+        _setQuantity(self, quantity)
+        _setPrice(self, price)
+        _setFee(self, fee)
+        _setDate(self, date)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Orders are immutable; \'{name}\' cannot be set.')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'Orders are immutable; \'{name}\' cannot be deleted.')
+
+    def __reduce__(self):
+        return Order, (self.symbol, self.direction, self.quantity, self.price, self.date, self.fee)
+
+    @staticmethod
+    def fromDict(order):
+        """
+        Creates an order from its JSON representation, as described in Orders.fromJSON.
+
+        Parameters
+        ----------
+            order: dict
+
+        Return
+        ------
+            Order
+        """
+        return Order(
+            symbol=order['symbol'],
+            direction={'buy': OrderDirection.Buy, 'sell': OrderDirection.Sell}[order['direction']],
+            quantity=order['quantity'],
+            price=Price(value=order['price']['value'], currency=order['price']['currency']),
+            fee=Price(value=order['fee']['value'], currency=order['fee']['currency']) if order.get('fee') else None,
+            date=datetime.datetime.strptime(order['date'], '%Y-%m-%d').date()
+        )
+
+    def _getFields(self):
+        return (self.symbol, self.direction, self.quantity, self.price, self.date, self.fee)
 
     def __hash__(self):
-        return hash((self.symbol, self.direction, self.quantity, self.price, self.date, self.fee))
+        try:
+            return self._hash
+        except AttributeError:
+            _setHash(self, hash(self._getFields()))
+            return self._hash
 
     def __eq__(self, order):
-        return isinstance(order, Order) and hash(self) == hash(order)
+        return isinstance(order, Order) and (self is order or (hash(self) == hash(order) and self._getFields() == order._getFields()))
+
+
+# The setters of the slots of Order, captured once (see price._setValue);
+_setSymbol, _setDirection, _setQuantity = Order.symbol.__set__, Order.direction.__set__, Order.quantity.__set__
+_setPrice, _setFee, _setDate, _setHash = Order.price.__set__, Order.fee.__set__, Order.date.__set__, Order._hash.__set__
 
 
 class Orders(object):
@@ -53,6 +105,9 @@ class Orders(object):
                 };
             }[]
 
+        The file is read incrementally (see iterFile), so it is never held in memory as a whole;
+        JSON Lines files are supported as well.
+
         Parameters
         ----------
             path: str
@@ -61,7 +116,56 @@ class Orders(object):
         ------
             Orders
         """
-        return Orders.fromJSON(open(path, 'r').read())
+        return Orders(list(Orders.iterFile(path)))
+
+    @staticmethod
+    def iterFile(path, chunkSize=None, blockSize=1 << 16):
+        """
+        Reads orders from a file one at a time, or in chunks of orders, parsing the file
+        incrementally, so that memory use is bounded regardless of the size of the file.
+
+        The file may either contain a JSON array of orders, formatted as described in fromFile, or
+        be in JSON Lines format, with one such order per line.
+
+        Parameters
+        ----------
+            path: str
+            chunkSize: int
+                If provided, Orders of up to this many orders are yielded instead of single orders.
+            blockSize: int
+                The number of characters read from the file at a time.
+
+        Return
+        ------
+            Iterator[Order] | Iterator[Orders]
+
+        Example
+        -------
+            >>> for orders in Orders.iterFile('orders.jsonl', chunkSize=10000):
+            ...     process(orders)
+        """
+
+        with open(path, 'r') as file:
+
+            head = file.read(blockSize)
+            if head.lstrip().startswith('['):
+                items = _iterJSONArray(file, head, blockSize)
+            else:
+                items = _iterJSONLines(file, head)
+
+            orders = map(Order.fromDict, items)
+            if not chunkSize:
+                yield from orders
+                return
+
+            chunk = []
+            for order in orders:
+                chunk.append(order)
+                if len(chunk) == chunkSize:
+                    yield Orders(chunk)
+                    chunk = []
+            if chunk:
+                yield Orders(chunk)
 
     @staticmethod
     def fromJSON(text):
@@ -94,27 +198,432 @@ class Orders(object):
             Orders
         """
 
-        orders = []
+        return Orders(list(map(Order.fromDict, json.loads(text))))
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Reads orders saved by Orders.save; the columns are memory-mapped, unless otherwise
+        specified, and no Order object is created until the orders are iterated.
+
+        Parameters
+        ----------
+            path: str
+                The directory the orders were saved into.
+            mmap: bool
 
-        for order in json.loads(text):
-            orders.append(
-                Order(
-                    symbol=order['symbol'],
-                    direction={'buy': OrderDirection.Buy, 'sell': OrderDirection.Sell}[order['direction']],
-                    quantity=order['quantity'],
-                    price=Price(value=order['price']['value'], currency=order['price']['currency']),
-                    fee=Price(value=order['fee']['value'], currency=order['fee']['currency']) if order.get('fee') else None,
-                    date=datetime.datetime.strptime(order['date'], '%Y-%m-%d').date()
-                )
-            )
+        Return
+        ------
+            Orders
+        """
+        with open(os.path.join(path, _SNAPSHOT_METADATA_FILE_NAME), 'r') as file:
+            metadata = json.load(file)
 
-        return Orders(orders)
+        columns = {field: numpy.load(os.path.join(path, f'{field}.npy'), mmap_mode='r' if mmap else None) for field in OrderTable.FIELDS}
+        columns['date'] = columns['date'].view('datetime64[D]')
 
-    def __init__(self, orders):
-        self.orders = orders
+        return Orders(table=OrderTable(columns, metadata['symbols'], metadata['currencies']))
 
-    def __hash__(self):
-        return hash(tuple(self.orders))
+    def save(self, path):
+        """
+        Saves the orders into a directory in a binary columnar format, with one NumPy file per
+        column (dates being stored as integer days since the epoch) and a JSON file holding the
+        symbols and currencies; it is much faster to load than JSON and can be memory-mapped.
+
+        Each file is written through a temporary one which then replaces it, the JSON file last, so
+        that orders loaded (and memory-mapped) from the same directory can be saved back over it.
+
+        Parameters
+        ----------
+            path: str
+                The directory to save the orders into, created if it does not exist.
+        """
+        table = self.table
+        os.makedirs(path, exist_ok=True)
+
+        for field in OrderTable.FIELDS:
+            values = table.columns[field]
+            if field == 'date':
+                values = values.astype('datetime64[D]').view(numpy.int64)
+            _replaceFile(os.path.join(path, f'{field}.npy'), lambda file: numpy.save(file, values))
+
+        metadata = {'version': 1, 'symbols': table.symbols, 'currencies': table.currencies}
+        _replaceFile(os.path.join(path, _SNAPSHOT_METADATA_FILE_NAME), lambda file: file.write(json.dumps(metadata).encode()))
+
+    def __init__(self, orders=None, table=None):
+        """
+        Initialises the orders given either the orders themselves or their columnar table.
+
+        Parameters
+        ----------
+            orders: list[Order]
+            table: OrderTable
+        """
+        self._orders = _OrderList(self._resetTable, orders) if orders is not None or table is None else None
+        self._table = table
+
+    @property
+    def orders(self):
+
+        """
+        The list of orders, created on demand if the orders were initialised from a table; changing
+        it discards the table, which is then rebuilt on demand.
+        """
+
+        if self._orders is None:
+            self._orders = _OrderList(self._resetTable, map(self._table.getOrder, range(len(self._table))))
+        return self._orders
+
+    @orders.setter
+    def orders(self, orders):
+        self._orders = _OrderList(self._resetTable, orders)
+        self._table = None
+
+    @property
+    def table(self):
+
+        """The columnar table of the orders, built on demand."""
+
+        if self._table is None:
+            self._table = OrderTable.fromOrders(self._orders)
+        return self._table
+
+    def _resetTable(self):
+        self._table = None
+
+    def __reduce__(self):
+        return (Orders, (list(self),))
+
+    def __len__(self):
+        return len(self._orders) if self._orders is not None else len(self._table)
+
+    def __iter__(self):
+        if self._orders is not None:
+            return iter(self._orders)
+        return map(self._table.getOrder, range(len(self._table)))
+
+    def filter(self, symbol=None, startDate=None, endDate=None, direction=None):
+        """
+        Returns the orders matching all the given criteria, in their original order; dates are
+        looked up through the sorted date index (of the symbol, if given).
+
+        Parameters
+        ----------
+            symbol: str
+            startDate: datetime.date
+                Inclusive.
+            endDate: datetime.date
+                Inclusive.
+            direction: OrderDirection
+
+        Return
+        ------
+            Orders
+        """
+        table = self.table
+
+        rows = table.getSymbolIndex().get(symbol, numpy.array([], dtype=int)) if symbol is not None else table.getDateIndex()
+        dates = table.columns['date'][rows]
+        first = numpy.searchsorted(dates, numpy.datetime64(startDate, 'D')) if startDate is not None else 0
+        last = numpy.searchsorted(dates, numpy.datetime64(endDate, 'D'), side='right') if endDate is not None else len(rows)
+        rows = numpy.sort(rows[first:last])
+
+        if direction is not None:
+            rows = rows[table.columns['direction'][rows] == _DIRECTION_SIGNS[direction]]
+
+        return Orders(table=table.take(rows))
+
+    def groupBySymbol(self):
+        """
+        Returns the orders of each symbol.
+
+        Return
+        ------
+            dict[str: Orders]
+        """
+        table = self.table
+        return {symbol: Orders(table=table.take(numpy.sort(rows))) for symbol, rows in table.getSymbolIndex().items()}
+
+    def getNetQuantities(self):
+        """
+        Returns the net quantity (bought minus sold) of each symbol.
+
+        Return
+        ------
+            dict[str: float]
+        """
+        table = self.table
+        signedQuantities = table.columns['direction'] * table.columns['quantity']
+        quantities = numpy.bincount(table.columns['symbol'], weights=signedQuantities, minlength=len(table.symbols))
+        return {symbol: float(quantity) for symbol, quantity in zip(table.symbols, quantities) if symbol in table.getSymbolIndex()}
+
+    def getTotalFees(self, currency=None):
+        """
+        Returns the total fees paid for each symbol with at least one fee, converted into the given
+        currency (at the exchange rate of the date of each order) if provided.
+
+        Parameters
+        ----------
+            currency: str
+
+        Return
+        ------
+            dict[str: Price]
+
+        Raise
+        -----
+            RuntimeError
+                If no currency is provided and the fees of a symbol are in different currencies,
+                or if no exchange rate is available for a fee.
+        """
+        table = self.table
+        rows = numpy.flatnonzero(table.columns['feeCurrency'] >= 0)
+        symbolCodes = table.columns['symbol'][rows]
+        fees = table.columns['fee'][rows]
+        feeCurrencyCodes = table.columns['feeCurrency'][rows]
+
+        if currency is not None:
+            fees, missing = convertBatch(fees, numpy.array(table.currencies, dtype=object)[feeCurrencyCodes], currency, dates=table.columns['date'][rows], asOf=True)
+            if missing.any():
+                raise RuntimeError(f'No exchange rate could be found for {int(missing.sum())} fees.')
+            currencies = {code: currency for code in set(symbolCodes.tolist())}
+        else:
+            currencies = {}
+            for code, feeCurrencyCode in set(zip(symbolCodes.tolist(), feeCurrencyCodes.tolist())):
+                if currencies.setdefault(code, table.currencies[feeCurrencyCode]) != table.currencies[feeCurrencyCode]:
+                    raise RuntimeError(f'The fees for {table.symbols[code]} are in different currencies; a currency to convert them into must be provided.')
+
+        totals = numpy.bincount(symbolCodes, weights=fees, minlength=len(table.symbols))
+        return {table.symbols[code]: Price(float(totals[code]), currencies[code]) for code in sorted(currencies)}
+
+    @staticmethod
+    def merge(*ordersList):
+        """
+        Merges several, possibly overlapping, sets of orders (e.g. exports from different brokers
+        or for overlapping periods) in linear time: each distinct order is kept as many times as
+        it occurs in the set where it occurs the most, so that orders shared by several sets are
+        not duplicated, while genuinely repeated orders within a set are preserved.
+
+        Parameters
+        ----------
+            ordersList: Orders
+
+        Return
+        ------
+            Orders
+        """
+        counts = {}
+        for orders in ordersList:
+            for order, count in Counter(orders).items():
+                counts[order] = max(counts.get(order, 0), count)
+        return Orders([order for order, count in counts.items() for _ in range(count)])
+
+    def deduplicate(self):
+        """
+        Returns the orders without duplicates, keeping the first occurrence of each, in linear time.
+
+        Return
+        ------
+            Orders
+        """
+        return Orders(list(dict.fromkeys(self)))
+
+    # Orders are mutable, so they are not hashable: a hash would either go stale as the orders change
+    # or have to be recomputed over all of them on every call;
+    __hash__ = None
 
     def __eq__(self, orders):
-        return isinstance(orders, Orders) and hash(orders) == hash(self)
\ No newline at end of file
+        return isinstance(orders, Orders) and len(self) == len(orders) and self.orders == orders.orders
+
+
+class _OrderList(list):
+
+    """A list of orders which calls back on any change, so that the table derived from it is discarded."""
+
+    def __init__(self, onChange, orders=()):
+        super().__init__(orders)
+        self._onChange = onChange
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _notifying(name):
+    method = getattr(list, name)
+    def notifyingMethod(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._onChange()
+        return result
+    notifyingMethod.__name__ = name
+    return notifyingMethod
+
+
+for _name in ('append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(_OrderList, _name, _notifying(_name))
+del _name
+
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def _iterJSONArray(file, buffer, blockSize):
+
+    """
+    Yields the items of the JSON array in a file, reading it a block at a time; the given buffer
+    holds the beginning of the file already read.
+    """
+
+    decoder = json.JSONDecoder()
+    position = buffer.index('[') + 1
+    isExhausted = False
+
+    while True:
+
+        position = _SEPARATORS.match(buffer, position).end()
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError('Unterminated array', buffer, position)
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if isExhausted:
+                raise
+            block = file.read(blockSize)
+            isExhausted = not block
+            buffer, position = buffer[position:] + block, 0
+            continue
+
+        yield item
+
+
+def _iterJSONLines(file, buffer):
+
+    """Yields the items of the JSON Lines file, whose beginning was already read into the given buffer."""
+
+    lines = iter(file)
+    head, _, rest = buffer.rpartition('\n')
+    for line in head.split('\n') if head else []:
+        if line.strip():
+            yield json.loads(line)
+
+    line = rest + next(lines, '')
+    while line:
+        if line.strip():
+            yield json.loads(line)
+        line = next(lines, '')
+
+
+_SNAPSHOT_METADATA_FILE_NAME = 'orders.json'
+
+_DIRECTION_SIGNS = {OrderDirection.Buy: 1, OrderDirection.Sell: -1}
+_SIGN_DIRECTIONS = {sign: direction for direction, sign in _DIRECTION_SIGNS.items()}
+
+
+class OrderTable(object):
+
+    """
+    A columnar representation of orders, as NumPy arrays: symbols and currencies are stored as
+    integer codes into the lists of distinct symbols and currencies, directions as signs (1 for
+    buying and -1 for selling) and missing fees as NaN (with a currency code of -1).
+
+    It lazily builds a date index (the rows sorted by date) and a symbol index (the rows of each
+    symbol sorted by date), used for range queries and grouping.
+    """
+
+    FIELDS = ('symbol', 'direction', 'quantity', 'price', 'priceCurrency', 'fee', 'feeCurrency', 'date')
+
+    def __init__(self, columns, symbols, currencies):
+        """
+        Parameters
+        ----------
+            columns: dict[str: numpy.ndarray]
+                An array for each of the FIELDS.
+            symbols: list[str]
+            currencies: list[str]
+        """
+        self.columns = columns
+        self.symbols = list(symbols)
+        self.currencies = list(currencies)
+        self._dateIndex = None
+        self._symbolIndex = None
+
+    @staticmethod
+    def fromOrders(orders):
+        """
+        Parameters
+        ----------
+            orders: list[Order]
+
+        Return
+        ------
+            OrderTable
+        """
+        symbols, currencies = {}, {}
+        getCode = lambda codes, value: codes.setdefault(value, len(codes))
+
+        columns = {
+            'symbol': numpy.array([getCode(symbols, order.symbol) for order in orders], dtype=numpy.int32),
+            'direction': numpy.array([_DIRECTION_SIGNS[order.direction] for order in orders], dtype=numpy.int8),
+            'quantity': numpy.array([order.quantity for order in orders], dtype=float),
+            'price': numpy.array([order.price.value for order in orders], dtype=float),
+            'priceCurrency': numpy.array([getCode(currencies, order.price.currency) for order in orders], dtype=numpy.int32),
+            'fee': numpy.array([order.fee.value if order.fee else numpy.nan for order in orders], dtype=float),
+            'feeCurrency': numpy.array([getCode(currencies, order.fee.currency) if order.fee else -1 for order in orders], dtype=numpy.int32),
+            'date': numpy.array([order.date for order in orders], dtype='datetime64[D]'),
+        }
+
+        return OrderTable(columns, symbols, currencies)
+
+    def __len__(self):
+        return len(self.columns['date'])
+
+    def getOrder(self, row):
+        """
+        Returns the order in the given row.
+
+        Return
+        ------
+            Order
+        """
+        columns = self.columns
+        feeCurrency = columns['feeCurrency'][row]
+        return Order(
+            symbol=self.symbols[columns['symbol'][row]],
+            direction=_SIGN_DIRECTIONS[int(columns['direction'][row])],
+            quantity=float(columns['quantity'][row]),
+            price=Price(float(columns['price'][row]), self.currencies[columns['priceCurrency'][row]]),
+            fee=Price(float(columns['fee'][row]), self.currencies[feeCurrency]) if feeCurrency >= 0 else None,
+            date=columns['date'][row].item()
+        )
+
+    def take(self, rows):
+        """
+        Returns a table with the given rows only, sharing the symbols and currencies.
+
+        Return
+        ------
+            OrderTable
+        """
+        return OrderTable({field: values[rows] for field, values in self.columns.items()}, self.symbols, self.currencies)
+
+    def getDateIndex(self):
+        """Returns the rows sorted by date."""
+        if self._dateIndex is None:
+            self._dateIndex = numpy.argsort(self.columns['date'], kind='stable')
+        return self._dateIndex
+
+    def getSymbolIndex(self):
+        """Returns the rows of each symbol present, sorted by date."""
+        if self._symbolIndex is None:
+            dateIndex = self.getDateIndex()
+            codes = self.columns['symbol'][dateIndex]
+            order = numpy.argsort(codes, kind='stable')
+            boundaries = numpy.flatnonzero(numpy.diff(codes[order])) + 1
+            self._symbolIndex = {
+                self.symbols[codes[rows[0]]]: dateIndex[rows]
+                for rows in numpy.split(order, boundaries) if len(rows)
+            }
+        return self._symbolIndex
@@ -0,0 +1,218 @@
+import threading
+import time
+import warnings
+from price import Price
+import ticker
+
+
+# The polling intervals, in seconds: symbols whose price changed are polled again after the
+# minimum interval, which doubles (up to the maximum) each time their price is found unchanged;
+# symbols whose market is not open are polled after the closed market interval;
+MIN_INTERVAL = 5.
+MAX_INTERVAL = 60.
+CLOSED_MARKET_INTERVAL = 15 * 60.
+
+
+class PricePoller(object):
+
+    """
+    Polls the current market prices of the subscribed symbols, delivering each price to the
+    callbacks subscribed to its symbol only when it changes.
+
+    The symbols due at each round are requested together from the multi-symbol quote endpoint,
+    bypassing the response cache, so that the number of requests grows with the number of batches
+    rather than with the number of symbols. Each symbol is polled at its own interval, adapted to
+    how often its price changes and to whether its market is open.
+
+    Symbols whose price cannot be retrieved are polled less and less often, up to the closed market
+    interval, and the error is reported to their subscribers (or warned about, if none of them
+    handles errors) when they start failing.
+
+    Example
+    -------
+        >>> poller = PricePoller()
+        >>> poller.subscribe('SWDA.L', lambda symbol, price: print(symbol, price))
+        >>> poller.start()
+        SWDA.L 70.2 GBP
+        SWDA.L 70.25 GBP
+        >>> poller.stop()
+    """
+
+    def __init__(self, minInterval: float=MIN_INTERVAL, maxInterval: float=MAX_INTERVAL, closedMarketInterval: float=CLOSED_MARKET_INTERVAL):
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.closedMarketInterval = closedMarketInterval
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._wakeUp = threading.Event()
+        self._thread = None
+        self._isStopped = True
+
+    def subscribe(self, symbol: str, callback, errorCallback=None):
+
+        """
+        Subscribes a callback, called with the symbol and its Price, to the changes of the price
+        of a symbol; the first poll of a symbol always delivers its price, and a callback subscribed
+        to a symbol which was already polled is called right away with its last known price.
+
+        The error callback, if any, is called with the symbol and the exception when the price of
+        the symbol starts failing to be retrieved.
+        """
+
+        with self._lock:
+            subscription = self._subscriptions.setdefault(symbol, _Subscription(self.minInterval))
+            subscription.callbacks.append((callback, errorCallback))
+            price = subscription.price
+        if price is not None:
+            _call(callback, symbol, price)
+        self._wakeUp.set()
+
+    def unsubscribe(self, symbol: str, callback=None):
+
+        """Unsubscribes a callback from a symbol, or all of them if no callback is given."""
+
+        with self._lock:
+            subscription = self._subscriptions.get(symbol)
+            if subscription is None:
+                return
+            if callback is not None:
+                subscription.callbacks = [callbacks for callbacks in subscription.callbacks if callbacks[0] != callback]
+            if callback is None or not subscription.callbacks:
+                del self._subscriptions[symbol]
+
+    def start(self):
+
+        """Starts polling in a background thread."""
+
+        if self._thread is not None:
+            return
+        self._isStopped = False
+        self._thread = threading.Thread(target=self._run, name='PricePoller', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+
+        """Stops polling, waiting for the current round to complete."""
+
+        if self._thread is None:
+            return
+        self._isStopped = True
+        self._wakeUp.set()
+        self._thread.join()
+        self._thread = None
+
+    def poll(self, now=None):
+
+        """
+        Requests the prices of the symbols due to be polled and delivers the changed ones.
+
+        Parameters
+        ----------
+            now: float
+                The current time, as per time.monotonic.
+
+        Return
+        ------
+            int
+                The number of changed prices delivered.
+        """
+
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            symbols = [symbol for symbol, subscription in self._subscriptions.items() if subscription.nextPoll <= now]
+        if not symbols:
+            return 0
+
+        quotes, errors = ticker._getQuotes(symbols, useCache=False)
+        timestamp = time.time()
+
+        changes, failures = [], []
+        with self._lock:
+            for symbol in symbols:
+                subscription = self._subscriptions.get(symbol)
+                if subscription is None:
+                    continue
+                try:
+                    quote = quotes[symbol]
+                    price = Price(quote['regularMarketPrice'], quote['currency'])
+                except (KeyError, TypeError) as error:
+                    if not subscription.isFailing:
+                        failures.append((symbol, errors.get(symbol, error), list(subscription.callbacks)))
+                    subscription.isFailing = True
+                    subscription.interval = min(subscription.interval * 2, max(self.maxInterval, self.closedMarketInterval))
+                else:
+                    subscription.isFailing = False
+                    if price != subscription.price:
+                        subscription.price = price
+                        subscription.interval = self.minInterval
+                        changes.append((symbol, price, list(subscription.callbacks)))
+                    else:
+                        subscription.interval = min(subscription.interval * 2, self.maxInterval)
+                    if not _isMarketOpen(quote, timestamp):
+                        subscription.interval = self.closedMarketInterval
+                subscription.nextPoll = now + subscription.interval
+
+        for symbol, price, callbacks in changes:
+            for callback, _ in callbacks:
+                _call(callback, symbol, price)
+
+        for symbol, error, callbacks in failures:
+            errorCallbacks = [errorCallback for _, errorCallback in callbacks if errorCallback is not None]
+            if not errorCallbacks:
+                warnings.warn(f'The price of {symbol} could not be polled ({error!r}).')
+            for errorCallback in errorCallbacks:
+                _call(errorCallback, symbol, error)
+
+        return len(changes)
+
+    def _getTimeToNextPoll(self):
+        with self._lock:
+            nextPoll = min((subscription.nextPoll for subscription in self._subscriptions.values()), default=None)
+        if nextPoll is None:
+            return None
+        return max(0., nextPoll - time.monotonic())
+
+    def _run(self):
+        while not self._isStopped:
+            self._wakeUp.clear()
+            try:
+                self.poll()
+            except Exception as exception:
+                warnings.warn(f'Prices could not be polled ({exception!r}).')
+                self._wakeUp.wait(self.minInterval)
+                continue
+            self._wakeUp.wait(self._getTimeToNextPoll())
+
+
+def _call(callback, symbol, value):
+    try:
+        callback(symbol, value)
+    except Exception as exception:
+        warnings.warn(f'A callback for the price of {symbol} failed ({exception!r}).')
+
+
+def _isMarketOpen(quote, timestamp):
+
+    """
+    Returns whether the market of a quote is open at the given time, as per its market state or,
+    for chart metadata which has none, its current regular trading period.
+    """
+
+    if 'marketState' in quote:
+        return quote['marketState'] == 'REGULAR'
+    period = (quote.get('currentTradingPeriod') or {}).get('regular')
+    if not period:
+        return True
+    return period['start'] <= timestamp < period['end']
+
+
+class _Subscription(object):
+
+    __slots__ = ('callbacks', 'price', 'interval', 'nextPoll', 'isFailing')
+
+    def __init__(self, interval):
+        self.callbacks = []
+        self.price = None
+        self.interval = interval
+        self.nextPoll = 0.
+        self.isFailing = False
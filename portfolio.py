@@ -0,0 +1,191 @@
+from collections import namedtuple
+from enum import Enum
+import numpy
+from currency import convertBatch
+from order import Orders
+from price import Price
+
+
+class CostBasisMethod(Enum):
+
+    FIFO = 'FIFO'
+    Average = 'Average'
+
+
+Position = namedtuple('Position', ['quantity', 'cost', 'averageCost', 'realisedProfit'])
+Position.__doc__ = """
+The position held in a symbol: the quantity held, its cost basis (including buying fees), the
+average cost per unit and the profit realised by selling (net of selling fees), all in the base
+currency of the portfolio.
+"""
+
+
+class Portfolio(object):
+
+    """
+    Maintains the positions, cost basis and realised profit of each symbol from orders, updated
+    incrementally: each update only processes the new orders, in time proportional to their number
+    rather than to the whole history.
+
+    The lots held for each symbol are kept in array-backed buffers and prices and fees are converted
+    into the base currency of the portfolio in one batch per update, at the exchange rate of the
+    date of each order (or the latest one before it).
+    """
+
+    def __init__(self, currency: str, method: CostBasisMethod=CostBasisMethod.FIFO):
+        """
+        Initialises an empty portfolio.
+
+        Parameters
+        ----------
+            currency: str
+                The base currency, into which prices and fees are converted.
+            method: CostBasisMethod
+                How the cost of sold units is determined: by consuming the oldest lots first
+                (FIFO) or at the average cost of the units held.
+        """
+        self.currency = currency
+        self.method = method
+        self.lastDate = None
+        self._lots = {}
+        self._realisedProfits = {}
+
+    def update(self, orders):
+        """
+        Applies new orders to the portfolio; they must not be dated before the orders previously
+        applied.
+
+        Parameters
+        ----------
+            orders: Orders | list[Order]
+
+        Raise
+        -----
+            RuntimeError
+                If an order is dated before those previously applied, if its quantity is not
+                positive, if an exchange rate is not available for it or if more units are sold
+                than held; the whole batch is checked before any order is applied, so that a
+                failed update leaves the portfolio unchanged.
+        """
+        orders = orders if isinstance(orders, Orders) else Orders(list(orders))
+        if not len(orders):
+            return
+
+        table = orders.table
+        columns = table.columns
+        rows = table.getDateIndex()
+        dates = columns['date'][rows]
+        if self.lastDate is not None and dates[0] < self.lastDate:
+            raise RuntimeError(f'Orders must be applied in date order; an order dated {dates[0]} follows one dated {self.lastDate}.')
+        quantities = columns['quantity'][rows]
+        if not (quantities > 0).all():
+            raise RuntimeError(f'Order quantities must be positive; {int((~(quantities > 0)).sum())} orders have a quantity of zero or less.')
+
+        currencies = numpy.array(table.currencies + [self.currency], dtype=object)
+        prices, missingPrices = convertBatch(columns['price'][rows], currencies[columns['priceCurrency'][rows]], self.currency, dates=dates, asOf=True)
+        hasFees = columns['feeCurrency'][rows] >= 0
+        fees, missingFees = convertBatch(numpy.where(hasFees, columns['fee'][rows], 0.), currencies[columns['feeCurrency'][rows]], self.currency, dates=dates, asOf=True)
+        if missingPrices.any() or (missingFees & hasFees).any():
+            raise RuntimeError(f'No exchange rate into {self.currency} could be found for {int(missingPrices.sum() + (missingFees & hasFees).sum())} prices or fees.')
+        fees = numpy.where(hasFees, fees, 0.)
+
+        symbols = numpy.array(table.symbols, dtype=object)[columns['symbol'][rows]].tolist()
+        directions, quantities = columns['direction'][rows].tolist(), quantities.tolist()
+
+        # Overselling only depends on the quantities held, so it is checked on those first;
+        held = {}
+        for symbol, direction, quantity in zip(symbols, directions, quantities):
+            heldQuantity = held.get(symbol, self._lots[symbol].quantity if symbol in self._lots else 0.)
+            if direction < 0 and quantity > heldQuantity + 1e-9 * max(1., heldQuantity):
+                raise RuntimeError(f'Cannot sell {quantity} units of {symbol}, as only {heldQuantity} are held.')
+            held[symbol] = max(0., heldQuantity + direction * quantity)
+
+        for symbol, direction, quantity, price, fee in zip(symbols, directions, quantities, prices.tolist(), fees.tolist()):
+            lots = self._lots.setdefault(symbol, _Lots(average=self.method == CostBasisMethod.Average))
+            if direction > 0:
+                lots.add(quantity, (price * quantity + fee) / quantity)
+            else:
+                self._realisedProfits[symbol] = self._realisedProfits.get(symbol, 0.) + price * quantity - fee - lots.remove(quantity)
+
+        self.lastDate = dates[-1]
+
+    def getPositions(self):
+        """
+        Returns the position of each symbol ever traded.
+
+        Return
+        ------
+            dict[str: Position]
+        """
+        positions = {}
+        for symbol, lots in self._lots.items():
+            quantity, cost = lots.quantity, lots.getCost()
+            positions[symbol] = Position(
+                quantity=quantity,
+                cost=Price(cost, self.currency),
+                averageCost=Price(cost / quantity if quantity else 0., self.currency),
+                realisedProfit=Price(self._realisedProfits.get(symbol, 0.), self.currency)
+            )
+        return positions
+
+
+class _Lots(object):
+
+    """
+    The lots held for a symbol, as a queue backed by arrays of quantities and unit costs which
+    grow by doubling; lots are consumed from the head, oldest first. In average mode, a single lot
+    is held, whose unit cost is the average cost.
+    """
+
+    def __init__(self, average=False, capacity=8):
+        self.average = average
+        self.quantities = numpy.zeros(capacity)
+        self.unitCosts = numpy.zeros(capacity)
+        self.head = 0
+        self.tail = 0
+        self.quantity = 0.
+
+    def add(self, quantity, unitCost):
+        if self.average and self.tail > self.head:
+            held = self.quantities[self.head]
+            self.unitCosts[self.head] = (held * self.unitCosts[self.head] + quantity * unitCost) / (held + quantity)
+            self.quantities[self.head] = held + quantity
+        else:
+            if self.tail == len(self.quantities):
+                self._compact()
+            self.quantities[self.tail] = quantity
+            self.unitCosts[self.tail] = unitCost
+            self.tail += 1
+        self.quantity += quantity
+
+    def remove(self, quantity):
+
+        """Removes the given quantity from the oldest lots and returns its cost."""
+
+        cost = 0.
+        self.quantity -= quantity
+        while quantity > 0 and self.head < self.tail:
+            consumed = min(quantity, self.quantities[self.head])
+            cost += consumed * self.unitCosts[self.head]
+            self.quantities[self.head] -= consumed
+            quantity -= consumed
+            if self.quantities[self.head] <= 0:
+                self.head += 1
+        if self.head == self.tail:
+            self.head = self.tail = 0
+            self.quantity = 0.
+        return float(cost)
+
+    def getCost(self):
+        return float(numpy.dot(self.quantities[self.head:self.tail], self.unitCosts[self.head:self.tail]))
+
+    def _compact(self):
+
+        """Moves the held lots to the front of the buffers, doubling them if more than half full."""
+
+        size = self.tail - self.head
+        capacity = len(self.quantities) * 2 if size > len(self.quantities) // 2 else len(self.quantities)
+        quantities, unitCosts = numpy.zeros(capacity), numpy.zeros(capacity)
+        quantities[:size] = self.quantities[self.head:self.tail]
+        unitCosts[:size] = self.unitCosts[self.head:self.tail]
+        self.quantities, self.unitCosts, self.head, self.tail = quantities, unitCosts, 0, size
@@ -1,9 +1,15 @@
-from currency import getExchangeRate
+import numpy
+from currency import BatchConversion, convertBatch, getExchangeRate
 
 
 class Price(object):
 
-    """Represents a price in monetary terms, defined by a numeric value and a currency."""
+    """
+    Represents a price in monetary terms, defined by a numeric value and a currency; prices are
+    immutable and their hash is computed once, when first needed.
+    """
+
+    __slots__ = ('value', 'currency', '_hash')
 
     def __init__(self, value: float, currency: str):
         """
@@ -14,19 +20,34 @@ class Price(object):
             value: float
             currency: str
         """
-        self.value = value
-        self.currency = currency
+        _setValue(self, value)
+        _setCurrency(self, currency)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Prices are immutable; \'{name}\' cannot be set.')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'Prices are immutable; \'{name}\' cannot be deleted.')
+
+    def __reduce__(self):
+        return Price, (self.value, self.currency)
 
     def __repr__(self) -> str:
         return f'{self.value} {self.currency}'
 
     def __hash__(self):
-        return hash((self.value, self.currency))
+        try:
+            return self._hash
+        except AttributeError:
+            _setHash(self, hash((self.value, self.currency)))
+            return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if not isinstance(other, Price):
+            return NotImplemented
+        return self.value == other.value and self.currency == other.currency
 
-    def convert(self, currency, date=None):
+    def convert(self, currency, date=None, asOf=False, maxStaleness=None):
         """
         Converts the price into a different currency, optionally for the exchange
         rate of a past date, if available.
@@ -35,6 +56,9 @@ class Price(object):
         ----------
             currency: str
             date: datetime.date
+            asOf: bool
+                If set, the latest exchange rate on or before the date is used.
+            maxStaleness: datetime.timedelta
 
         Return
         ------
@@ -45,4 +69,230 @@ class Price(object):
             >>> Price(1., 'USD').convert('GBP', date=datetime.date(2010, 5, 7))
             0.74 GBP
         """
-        return Price(self.value * getExchangeRate(self.currency, currency, date=date), currency)
+        return Price(self.value * getExchangeRate(self.currency, currency, date=date, asOf=asOf, maxStaleness=maxStaleness), currency)
+
+    @staticmethod
+    def convertBatch(prices, currency, dates=None, asOf=False, maxStaleness=None):
+        """
+        Converts many prices into a single currency at once, optionally each for the exchange
+        rate of its own date; rather than failing the whole batch, prices for which no exchange
+        rate is available are returned as None and flagged in the mask.
+
+        Parameters
+        ----------
+            prices: list[Price]
+            currency: str
+            dates: list[datetime.date]
+            asOf: bool
+            maxStaleness: datetime.timedelta
+
+        Return
+        ------
+            BatchConversion
+                Whose values are list[Price | None].
+
+        Example
+        -------
+            >>> Price.convertBatch([Price(1., 'USD'), Price(1., 'YEET')], 'GBP')
+            BatchConversion(values=[0.74 GBP, None], missing=array([False, True]))
+        """
+        values, missing = convertBatch([price.value for price in prices], [price.currency for price in prices], currency, dates=dates, asOf=asOf, maxStaleness=maxStaleness)
+        return BatchConversion(
+            [None if isMissing else Price(float(value), currency) for value, isMissing in zip(values, missing)],
+            missing
+        )
+
+    @staticmethod
+    def convertHistory(history, currency, maxStaleness=None):
+        """
+        Converts a series of daily prices, such as that returned by Ticker.getHistory, into a
+        different currency, aligning each date to the latest exchange rate on or before it in a
+        single pass; dates for which no such rate is available map to None.
+
+        Parameters
+        ----------
+            history: dict[datetime.date: Price]
+            currency: str
+            maxStaleness: datetime.timedelta
+
+        Return
+        ------
+            dict[datetime.date: Price | None]
+        """
+        dates = list(history)
+        prices, _ = Price.convertBatch(list(history.values()), currency, dates=dates, asOf=True, maxStaleness=maxStaleness)
+        return dict(zip(dates, prices))
+
+
+# The setters of the slots of Price, captured once: setting attributes is otherwise disallowed, and
+# calling them directly is much cheaper than going through object.__setattr__;
+_setValue, _setCurrency, _setHash = Price.value.__set__, Price.currency.__set__, Price._hash.__set__
+
+
+class PriceArray(object):
+
+    """
+    Represents many prices in the same currency, backed by a NumPy array of values rather than by
+    individual Price objects; arithmetic, comparisons, aggregations and conversion are vectorized,
+    and single elements are only materialised as Price objects when accessed.
+    """
+
+    __slots__ = ('values', 'currency')
+
+    __hash__ = None
+
+    def __init__(self, values, currency: str):
+        """
+        Initialises the price array given the amount values and their currency.
+
+        Parameters
+        ----------
+            values: array-like[float]
+            currency: str
+        """
+        self.values = numpy.asarray(values, dtype=float)
+        self.currency = currency
+
+    @staticmethod
+    def fromPrices(prices):
+        """
+        Creates a price array from prices sharing the same currency.
+
+        Parameters
+        ----------
+            prices: list[Price]
+
+        Return
+        ------
+            PriceArray
+
+        Raise
+        -----
+            RuntimeError
+                If the prices are not all in the same currency.
+        """
+        currencies = {price.currency for price in prices}
+        if len(currencies) != 1:
+            raise RuntimeError(f'A price array requires prices in exactly one currency, found {sorted(currencies)}.')
+        return PriceArray(numpy.fromiter((price.value for price in prices), dtype=float, count=len(prices)), currencies.pop())
+
+    def __repr__(self) -> str:
+        return f'PriceArray({self.values}, {self.currency})'
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        for value in self.values.tolist():
+            yield Price(value, self.currency)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, numpy.integer)):
+            return Price(float(self.values[index]), self.currency)
+        return PriceArray(self.values[index], self.currency)
+
+    def _getValues(self, other):
+
+        """Returns the values of a price or price array in the same currency, or None if the operand is not a price."""
+
+        if isinstance(other, (Price, PriceArray)):
+            if other.currency != self.currency:
+                raise RuntimeError(f'Cannot operate on prices in different currencies ({self.currency} and {other.currency}).')
+            return other.values if isinstance(other, PriceArray) else other.value
+        return None
+
+    def __add__(self, other):
+        values = self._getValues(other)
+        if values is None:
+            return NotImplemented
+        return PriceArray(self.values + values, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        values = self._getValues(other)
+        if values is None:
+            return NotImplemented
+        return PriceArray(self.values - values, self.currency)
+
+    def __rsub__(self, other):
+        values = self._getValues(other)
+        if values is None:
+            return NotImplemented
+        return PriceArray(values - self.values, self.currency)
+
+    def __neg__(self):
+        return PriceArray(-self.values, self.currency)
+
+    def __mul__(self, other):
+        if isinstance(other, (Price, PriceArray)):
+            return NotImplemented
+        return PriceArray(self.values * other, self.currency)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        values = self._getValues(other)
+        if values is None:
+            return PriceArray(self.values / other, self.currency)
+        return self.values / values
+
+    def __eq__(self, other):
+        if not isinstance(other, (Price, PriceArray)) or other.currency != self.currency:
+            return numpy.zeros(len(self.values), dtype=bool)
+        return self.values == self._getValues(other)
+
+    def __ne__(self, other):
+        return ~(self == other)
+
+    def __lt__(self, other):
+        values = self._getValues(other)
+        return NotImplemented if values is None else self.values < values
+
+    def __le__(self, other):
+        values = self._getValues(other)
+        return NotImplemented if values is None else self.values <= values
+
+    def __gt__(self, other):
+        values = self._getValues(other)
+        return NotImplemented if values is None else self.values > values
+
+    def __ge__(self, other):
+        values = self._getValues(other)
+        return NotImplemented if values is None else self.values >= values
+
+    def sum(self) -> Price:
+        return Price(float(self.values.sum()), self.currency)
+
+    def mean(self) -> Price:
+        return Price(float(self.values.mean()), self.currency)
+
+    def min(self) -> Price:
+        return Price(float(self.values.min()), self.currency)
+
+    def max(self) -> Price:
+        return Price(float(self.values.max()), self.currency)
+
+    def convert(self, currency, dates=None, asOf=False, maxStaleness=None):
+        """
+        Converts all prices into a different currency in a single pass, optionally each for the
+        exchange rate of its own date; prices for which no rate is available become NaN.
+
+        Parameters
+        ----------
+            currency: str
+            dates: array-like[datetime.date]
+            asOf: bool
+            maxStaleness: datetime.timedelta
+
+        Return
+        ------
+            PriceArray
+
+        Example
+        -------
+            >>> PriceArray([1., 2.], 'USD').convert('GBP', dates=[datetime.date(2010, 5, 7)] * 2)
+            PriceArray([0.68 1.36], GBP)
+        """
+        values, _ = convertBatch(self.values, self.currency, currency, dates=dates, asOf=asOf, maxStaleness=maxStaleness)
+        return PriceArray(values, currency)
@@ -1,8 +1,78 @@
 import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from urllib.error import HTTPError
+from zipfile import ZipFile
+import mock
 from unittest import TestCase
+import numpy
+import pandas
 import currency
 
 
+def _createConverter():
+    "Creates a currency converter from a small table laid out as the ECB one (latest date first)."
+    table = pandas.DataFrame(
+        {
+            'Date': ['2010-05-11', '2010-05-10', '2010-05-07'],
+            'USD': [1.2727, 1.2942, 1.2727],
+            'GBP': [0.8616, 0.8645, 0.8667],
+            'CYP': [numpy.nan, numpy.nan, 0.5853],
+        }
+    )
+    table['EUR'] = 1.
+    return currency._CurrencyConverter(table)
+
+
+class _ECBServer(object):
+
+    """A local HTTP stand-in for the ECB, serving a zipped table with an ETag and counting the full downloads."""
+
+    TABLE = 'Date,USD,GBP,\n2010-05-11,1.2727,0.8616,\n2010-05-10,1.2942,0.8645,\n2010-05-07,1.2727,0.8667,\n'
+
+    def __init__(self):
+        content = BytesIO()
+        with ZipFile(content, 'w') as file:
+            file.writestr(currency.CURRENCY_FILE_NAME, self.TABLE)
+        self.content = content.getvalue()
+        self.downloads = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                server.downloads += 1
+                self.send_response(200)
+                self.send_header('ETag', '"v1"')
+                self.send_header('Content-Length', str(len(server.content)))
+                self.end_headers()
+                self.wfile.write(server.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpServer = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.URL = f'http://127.0.0.1:{self.httpServer.server_port}/eurofxref-hist.zip'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpServer.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
+
+
 class TestCurrency(TestCase):
 
     def test_getCurrencyConverter(self):
@@ -26,4 +96,120 @@ class TestCurrency(TestCase):
         try:
             _ = currency._CurrencyConverter.download()
         except Exception:
-            self.fail('The converter failed to be initialised by download.')
\ No newline at end of file
+            self.fail('The converter failed to be initialised by download.')
+
+    def test_indexedExchangeRate(self):
+        "Tests that lookups on the indexed rate matrix match the table regardless of its order."
+        converter = _createConverter()
+        self.assertEqual(list(converter.dates), list(numpy.array(['2010-05-07', '2010-05-10', '2010-05-11'], dtype='datetime64[D]')))
+        self.assertEqual(converter.getAvailableCurrencies(), {'USD', 'GBP', 'CYP', 'EUR'})
+        self.assertEqual(converter.getExchangeRate('USD', 'GBP'), 0.8616 / 1.2727)
+        self.assertEqual(converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 10)), 0.8645 / 1.2942)
+        self.assertEqual(converter.getExchangeRate('EUR', 'CYP', date=datetime.date(2010, 5, 7)), 0.5853)
+        with self.assertRaises(RuntimeError):
+            _ = converter.getExchangeRate('EUR', 'CYP', date=datetime.date(2010, 5, 10))
+        with self.assertRaises(RuntimeError):
+            _ = converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 8))
+        with self.assertRaises(RuntimeError):
+            _ = converter.getExchangeRate('USD', 'YEET')
+
+    def test_convertBatch(self):
+        "Tests that a batch is converted in one pass and that elements without a rate are flagged rather than failing it."
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+            values, missing = currency.convertBatch(
+                [1., 2., 3., 4.],
+                ['USD', 'EUR', 'YEET', 'CYP'],
+                'GBP',
+                dates=[datetime.date(2010, 5, 10), datetime.date(2010, 5, 7), datetime.date(2010, 5, 7), datetime.date(2010, 5, 10)]
+            )
+        self.assertEqual(list(missing), [False, False, True, True])
+        self.assertEqual(list(values[:2]), [1. * 0.8645 / 1.2942, 2. * 0.8667])
+        self.assertTrue(numpy.isnan(values[2:]).all())
+
+    def test_asOfExchangeRate(self):
+        "Tests that as-of lookups fall back to the latest rate on or before a date, within the staleness limit."
+        converter = _createConverter()
+        self.assertEqual(converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 9), asOf=True), 0.8667 / 1.2727)
+        self.assertEqual(converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 10), asOf=True), 0.8645 / 1.2942)
+        self.assertEqual(converter.getExchangeRate('EUR', 'CYP', date=datetime.date(2010, 5, 12), asOf=True), 0.5853)
+        self.assertEqual(converter.getExchangeRate('EUR', 'CYP', asOf=True), 0.5853)
+        with self.assertRaises(RuntimeError):
+            _ = converter.getExchangeRate('EUR', 'CYP', date=datetime.date(2010, 5, 12), asOf=True, maxStaleness=datetime.timedelta(days=3))
+        with self.assertRaises(RuntimeError):
+            _ = converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 6), asOf=True)
+
+        rates = converter.getExchangeRates(
+            ['USD', 'EUR', 'EUR', 'USD'],
+            'GBP',
+            dates=[datetime.date(2010, 5, 9), datetime.date(2010, 5, 12), datetime.date(2010, 5, 6), datetime.date(2010, 5, 16)],
+            asOf=True,
+            maxStaleness=datetime.timedelta(days=3)
+        )
+        self.assertEqual(list(rates[:2]), [0.8667 / 1.2727, 0.8616])
+        self.assertTrue(numpy.isnan(rates[2:]).all())
+        self.assertEqual(list(converter.getExchangeRates('GBP', 'CYP', dates=[datetime.date(2010, 5, 11)], asOf=True)), [0.5853 / 0.8667])
+
+    def test_load(self):
+        "Tests that the table is cached on disk and only downloaded again when stale and modified."
+        with _ECBServer() as server, tempfile.TemporaryDirectory() as directory, mock.patch('currency.CURRENCY_TABLE_URL', server.URL):
+
+            converter = currency._CurrencyConverter.load(directory=directory)
+            self.assertEqual(server.downloads, 1)
+            self.assertEqual(converter.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 10)), 0.8645 / 1.2942)
+
+            # A fresh cache is read from disk (memory-mapped) without any request;
+            cached = currency._CurrencyConverter.load(directory=directory)
+            self.assertEqual(server.downloads, 1)
+            self.assertIsInstance(cached.rates, numpy.memmap)
+            self.assertEqual(cached.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 10)), 0.8645 / 1.2942)
+            self.assertEqual(list(cached.table['Date']), ['2010-05-07', '2010-05-10', '2010-05-11'])
+
+            # A stale cache is revalidated, but not downloaded again as the table is unchanged;
+            revalidated = currency._CurrencyConverter.load(directory=directory, ttl=datetime.timedelta(0))
+            self.assertEqual(server.downloads, 1)
+            self.assertEqual(revalidated.getAvailableCurrencies(), {'USD', 'GBP', 'EUR'})
+
+            # A failed refresh (e.g. the ECB being briefly unavailable) falls back on the stale cache;
+            unavailable = HTTPError(server.URL, 503, 'Service Unavailable', {}, None)
+            with mock.patch('currency.urlopen', side_effect=unavailable), self.assertWarns(UserWarning):
+                stale = currency._CurrencyConverter.load(directory=directory, ttl=datetime.timedelta(0))
+            self.assertEqual(stale.getAvailableCurrencies(), {'USD', 'GBP', 'EUR'})
+
+    def test_refreshExchangeRates(self):
+        "Tests that the global converter is extended with the daily feed, leaving the previous one untouched."
+        feed = b"""<?xml version="1.0" encoding="UTF-8"?>
+            <gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+                <Cube>
+                    <Cube time="2010-05-12"><Cube currency="USD" rate="1.2651"/><Cube currency="HRK" rate="7.2355"/></Cube>
+                    <Cube time="2010-05-11"><Cube currency="USD" rate="1.2727"/><Cube currency="GBP" rate="0.8616"/></Cube>
+                </Cube>
+            </gesmes:Envelope>"""
+        converter = _createConverter()
+        response = mock.MagicMock()
+        response.read.return_value = feed
+        with mock.patch('currency.CURRENCY_CONVERTER', converter), mock.patch('currency.CURRENCY_CACHE_DIRECTORY', None), \
+                mock.patch('currency.urlopen', return_value=response), mock.patch('currency.datetime') as now:
+            now.now.return_value = datetime.datetime(2010, 5, 12)
+            self.assertEqual(currency.refreshExchangeRates(), 1)
+            refreshed = currency.CURRENCY_CONVERTER
+        self.assertEqual(len(converter.dates), 3)
+        self.assertEqual(refreshed.getExchangeRate('USD', 'HRK', date=datetime.date(2010, 5, 12)), 7.2355 / 1.2651)
+        self.assertEqual(refreshed.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 11)), 0.8616 / 1.2727)
+        self.assertEqual(refreshed.getExchangeRate('USD', 'GBP', date=datetime.date(2010, 5, 12), asOf=True), 0.8616 / 1.2727)
+        self.assertEqual(refreshed.getExchangeRate('EUR', 'CYP', date=datetime.date(2010, 5, 12), asOf=True), 0.5853)
+        with self.assertRaises(RuntimeError):
+            _ = refreshed.getExchangeRate('USD', 'HRK', date=datetime.date(2010, 5, 11), asOf=True)
+
+    def test_lazyImport(self):
+        "Tests that importing the price and currency modules does not import pandas nor load the converter."
+        code = 'import sys, price, currency; print("pandas" in sys.modules, currency.CURRENCY_CONVERTER)'
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        self.assertEqual(output.split(), ['False', 'None'])
+
+    def test_warmUp(self):
+        "Tests that the converter is loaded once in the background and then used by conversions."
+        converter = _createConverter()
+        with mock.patch('currency.CURRENCY_CONVERTER', None), mock.patch('currency._CurrencyConverter.load', return_value=converter) as load:
+            currency.warmUp().join()
+            self.assertEqual(currency.getExchangeRate('USD', 'GBP'), 0.8616 / 1.2727)
+            self.assertEqual(load.call_count, 1)
@@ -0,0 +1,73 @@
+from datetime import date
+import tempfile
+from unittest import TestCase
+import numpy
+from history import DiskHistoryStore, HistoryStore
+
+
+class TestHistoryStore(TestCase):
+
+    def test_missingRanges(self):
+
+        """Tests that held ranges are merged and that only the gaps of a requested range are reported."""
+
+        store = HistoryStore()
+        history = {'date': numpy.array([], dtype='datetime64[D]'), 'close': numpy.array([])}
+        store.add('YEET', 'GBP', history, date(2021, 1, 1), date(2021, 1, 10))
+        store.add('YEET', 'GBP', history, date(2021, 1, 20), date(2021, 1, 31))
+        store.add('YEET', 'GBP', history, date(2021, 2, 1), date(2021, 2, 5))
+
+        self.assertEqual(store.getRanges('YEET'), [(date(2021, 1, 1), date(2021, 1, 10)), (date(2021, 1, 20), date(2021, 2, 5))])
+        self.assertEqual(store.getMissingRanges('YEET', date(2021, 1, 5), date(2021, 2, 10)), [(date(2021, 1, 11), date(2021, 1, 19)), (date(2021, 2, 6), date(2021, 2, 10))])
+        self.assertEqual(store.getMissingRanges('YEET', date(2021, 1, 2), date(2021, 1, 9)), [])
+        self.assertEqual(store.getMissingRanges('FOO', date(2021, 1, 2), date(2021, 1, 9)), [(date(2021, 1, 2), date(2021, 1, 9))])
+
+    def test_add(self):
+
+        """Tests that added histories are kept sorted and that newer values replace held ones."""
+
+        store = HistoryStore()
+        store.add('YEET', 'GBP', {'date': numpy.array(['2021-01-04', '2021-01-05'], dtype='datetime64[D]'), 'close': numpy.array([4., 5.])})
+        store.add('YEET', 'GBP', {'date': numpy.array(['2021-01-01', '2021-01-05'], dtype='datetime64[D]'), 'close': numpy.array([1., 50.])})
+
+        currency, history = store.get('YEET', date(2021, 1, 2), date(2021, 1, 5))
+        self.assertEqual(currency, 'GBP')
+        self.assertEqual(history['date'].tolist(), [date(2021, 1, 4), date(2021, 1, 5)])
+        self.assertEqual(history['close'].tolist(), [4., 50.])
+
+    def test_eviction(self):
+
+        """Tests that the least recently used symbols are evicted beyond the maximum number of dates held."""
+
+        store = HistoryStore(maxSize=3)
+        history = lambda *dates: {'date': numpy.array(dates, dtype='datetime64[D]'), 'close': numpy.arange(len(dates), dtype=float)}
+        store.add('A', 'GBP', history('2021-01-04', '2021-01-05'), date(2021, 1, 4), date(2021, 1, 5))
+        store.add('B', 'GBP', history('2021-01-04'), date(2021, 1, 4), date(2021, 1, 4))
+        store.get('A', date(2021, 1, 4), date(2021, 1, 5))
+        store.add('C', 'GBP', history('2021-01-04'), date(2021, 1, 4), date(2021, 1, 4))
+
+        self.assertEqual(store.getRanges('B'), [])
+        self.assertEqual(store.getRanges('A'), [(date(2021, 1, 4), date(2021, 1, 5))])
+        self.assertEqual(store.getPreviousValue('A', date(2021, 1, 5)), 0.)
+        self.assertIsNone(store.getPreviousValue('A', date(2021, 1, 4)))
+
+    def test_diskStore(self):
+
+        """Tests that histories and ranges are persisted by symbol and read back, memory-mapped, by another store."""
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            store = DiskHistoryStore(directory)
+            store.add('^YEET', 'GBP', {'date': numpy.array(['2021-01-04', '2021-01-05'], dtype='datetime64[D]'), 'close': numpy.array([4., 5.])}, date(2021, 1, 1), date(2021, 1, 5))
+            store.add('^YEET', 'GBP', {'date': numpy.array(['2021-01-06'], dtype='datetime64[D]'), 'close': numpy.array([6.])}, date(2021, 1, 6), date(2021, 1, 6))
+
+            store = DiskHistoryStore(directory)
+            self.assertEqual(store.getSymbols(), ['^YEET'])
+            self.assertEqual(store.getRanges('^YEET'), [(date(2021, 1, 1), date(2021, 1, 6))])
+            currency, history = store.get('^YEET', date(2021, 1, 1), date(2021, 1, 6))
+            self.assertEqual(currency, 'GBP')
+            self.assertIsInstance(history['close'], numpy.memmap)
+            self.assertEqual(history['close'].tolist(), [4., 5., 6.])
+
+            store.clear()
+            self.assertEqual(DiskHistoryStore(directory).getRanges('^YEET'), [])
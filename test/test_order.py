@@ -2,7 +2,12 @@ import datetime
 from unittest import TestCase
 from order import Order, OrderDirection, Orders
 import json
+import os
+import pickle
+import tempfile
+import mock
 from price import Price
+from test.test_currency import _createConverter
 
 
 class TestOrders(TestCase):
@@ -39,4 +44,143 @@ class TestOrders(TestCase):
 
         self.assertEquals(Orders.fromJSON(text), Orders([order]))
 
+    def test_iterFile(self):
 
+        orders = [
+            {
+                "symbol": f"S{index}",
+                "direction": "buy" if index % 2 else "sell",
+                "quantity": index,
+                "price": {"value": index * 1.5, "currency": "GBP"},
+                "fee": {"value": 1, "currency": "GBP"} if index % 3 else None,
+                "date": f"2021-01-{index % 28 + 1:02d}"
+            }
+            for index in range(100)
+        ]
+        expected = Orders.fromJSON(json.dumps(orders))
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            arrayPath = os.path.join(directory, 'orders.json')
+            with open(arrayPath, 'w') as file:
+                file.write(json.dumps(orders, indent=4))
+
+            linesPath = os.path.join(directory, 'orders.jsonl')
+            with open(linesPath, 'w') as file:
+                file.write('\n'.join(map(json.dumps, orders)) + '\n\n')
+
+            # Small blocks ensure orders are split across reads;
+            for path in (arrayPath, linesPath):
+                self.assertEqual(Orders(list(Orders.iterFile(path, blockSize=50))), expected)
+                self.assertEqual(Orders.fromFile(path), expected)
+
+                chunks = list(Orders.iterFile(path, chunkSize=30, blockSize=50))
+                self.assertEqual([len(chunk.orders) for chunk in chunks], [30, 30, 30, 10])
+                self.assertEqual(Orders([order for chunk in chunks for order in chunk.orders]), expected)
+
+            emptyPath = os.path.join(directory, 'empty.json')
+            with open(emptyPath, 'w') as file:
+                file.write(' [ ] ')
+            self.assertEqual(list(Orders.iterFile(emptyPath)), [])
+
+    def test_table(self):
+
+        orders = Orders([
+            Order('A', OrderDirection.Buy, 10, Price(1, 'GBP'), datetime.date(2010, 5, 11), fee=Price(1, 'GBP')),
+            Order('B', OrderDirection.Buy, 5, Price(2, 'USD'), datetime.date(2010, 5, 7), fee=Price(1, 'USD')),
+            Order('A', OrderDirection.Sell, 4, Price(3, 'GBP'), datetime.date(2010, 5, 7)),
+            Order('B', OrderDirection.Sell, 1, Price(4, 'USD'), datetime.date(2010, 5, 10), fee=Price(1, 'EUR')),
+            Order('A', OrderDirection.Buy, 1, Price(5, 'GBP'), datetime.date(2010, 5, 9), fee=Price(2, 'GBP')),
+        ])
+
+        # Orders are materialised from the table on demand, and match the original ones;
+        self.assertEqual(Orders(table=orders.table), orders)
+        self.assertEqual(len(Orders(table=orders.table)), 5)
+
+        self.assertEqual(orders.filter(symbol='A').orders, [orders.orders[0], orders.orders[2], orders.orders[4]])
+        self.assertEqual(orders.filter(startDate=datetime.date(2010, 5, 8), endDate=datetime.date(2010, 5, 10)).orders, [orders.orders[3], orders.orders[4]])
+        self.assertEqual(orders.filter(symbol='A', endDate=datetime.date(2010, 5, 9), direction=OrderDirection.Buy).orders, [orders.orders[4]])
+        self.assertEqual(len(orders.filter(symbol='YEET')), 0)
+
+        self.assertEqual({symbol: len(group) for symbol, group in orders.groupBySymbol().items()}, {'A': 3, 'B': 2})
+        self.assertEqual(orders.getNetQuantities(), {'A': 7, 'B': 4})
+        self.assertEqual(orders.filter(symbol='A').getTotalFees(), {'A': Price(3, 'GBP')})
+        with self.assertRaises(RuntimeError):
+            orders.getTotalFees()
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+            fees = orders.getTotalFees('EUR')
+        self.assertEqual(sorted(fees), ['A', 'B'])
+        self.assertEqual({fee.currency for fee in fees.values()}, {'EUR'})
+        self.assertAlmostEqual(fees['A'].value, 1 / 0.8616 + 2 / 0.8667)
+        self.assertAlmostEqual(fees['B'].value, 1 / 1.2727 + 1)
+
+    def test_tableFollowsOrders(self):
+
+        """Tests that changing the list of orders discards the table, so that queries reflect the change."""
+
+        order = lambda symbol: Order(symbol=symbol, direction=OrderDirection.Buy, quantity=1, price=Price(1., 'GBP'), fee=None, date=datetime.date(2010, 5, 7))
+        orders = Orders([order('A')])
+        self.assertEqual(orders.getNetQuantities(), {'A': 1})
+
+        orders.orders.append(order('A'))
+        self.assertEqual(len(orders.filter(symbol='A')), 2)
+        orders.orders[0] = order('B')
+        self.assertEqual(orders.getNetQuantities(), {'A': 1, 'B': 1})
+        orders.orders = [order('C')]
+        self.assertEqual(orders.getNetQuantities(), {'C': 1})
+
+        loaded = pickle.loads(pickle.dumps(orders))
+        loaded.orders.append(order('C'))
+        self.assertEqual(loaded.getNetQuantities(), {'C': 2})
+
+        with self.assertRaises(TypeError):
+            hash(orders)
+
+    def test_saveAndLoad(self):
+
+        orders = Orders([
+            Order('A', OrderDirection.Buy, 10, Price(1.1, 'GBP'), datetime.date(2010, 5, 11), fee=Price(1, 'GBP')),
+            Order('B', OrderDirection.Sell, 5.5, Price(2.2, 'USD'), datetime.date(1969, 5, 7)),
+        ])
+
+        with tempfile.TemporaryDirectory() as directory:
+            orders.save(directory)
+            for mmap in (True, False):
+                loaded = Orders.load(directory, mmap=mmap)
+                self.assertEqual(loaded, orders)
+                self.assertEqual(loaded.orders[1].fee, None)
+                self.assertEqual(loaded.orders[1].date, datetime.date(1969, 5, 7))
+            self.assertEqual(Orders.load(directory).getNetQuantities(), {'A': 10, 'B': -5.5})
+
+        # A loaded (memory-mapped) snapshot can be saved back over the directory it was loaded from.
+        orders = Orders([Order(f'S{index % 7}', OrderDirection.Buy, index + 1, Price(1.1, 'GBP'), datetime.date(2010, 5, 11)) for index in range(20000)])
+        with tempfile.TemporaryDirectory() as directory:
+            orders.save(directory)
+            Orders.load(directory).save(directory)
+            self.assertEqual(Orders.load(directory, mmap=False), orders)
+            self.assertFalse([name for name in os.listdir(directory) if name.endswith('.tmp')])
+
+    def test_immutability(self):
+
+        order = Order('A', OrderDirection.Buy, 10, Price(1.1, 'GBP'), datetime.date(2010, 5, 11), fee=Price(1, 'GBP'))
+        with self.assertRaises(AttributeError):
+            order.quantity = 11
+        with self.assertRaises(AttributeError):
+            order.price.value = 2
+        self.assertEqual(pickle.loads(pickle.dumps(order)), order)
+        self.assertEqual(hash(pickle.loads(pickle.dumps(order))), hash(order))
+
+        # Equality compares fields, not hashes, so that colliding hashes do not make orders equal;
+        other = Order('A', OrderDirection.Buy, 10, Price(1.1, 'GBP'), datetime.date(2010, 5, 11), fee=Price(2, 'GBP'))
+        object.__setattr__(other, '_hash', hash(order))
+        self.assertNotEqual(order, other)
+
+    def test_mergeAndDeduplicate(self):
+
+        createOrder = lambda symbol, day: Order(symbol, OrderDirection.Buy, 1, Price(1, 'GBP'), datetime.date(2021, 1, day))
+
+        first = Orders([createOrder('A', 1), createOrder('A', 1), createOrder('B', 2)])
+        second = Orders([createOrder('B', 2), createOrder('A', 1), createOrder('C', 3)])
+
+        self.assertEqual(Orders.merge(first, second), Orders([createOrder('A', 1), createOrder('A', 1), createOrder('B', 2), createOrder('C', 3)]))
+        self.assertEqual(first.deduplicate(), Orders([createOrder('A', 1), createOrder('B', 2)]))
@@ -0,0 +1,113 @@
+import threading
+from unittest import TestCase
+import mock
+from poller import PricePoller
+from price import Price
+import requests
+
+
+class TestPricePoller(TestCase):
+
+    def test_poll(self):
+
+        """Validate that due symbols are requested in one batch, that only changed prices are delivered and that intervals adapt."""
+
+        prices = {'FOO': 1., 'BAR': 2.}
+        requests = []
+
+        def sendRequest(URL, useCache=True):
+            self.assertFalse(useCache)
+            symbols = URL.split('symbols=')[1].split(',')
+            requests.append(symbols)
+            return {'quoteResponse': {'result': [
+                {'symbol': symbol, 'regularMarketPrice': prices[symbol], 'currency': 'GBP', 'marketState': 'REGULAR' if symbol == 'FOO' else 'CLOSED'}
+                for symbol in symbols
+            ]}}
+
+        delivered = []
+        poller = PricePoller(minInterval=5., maxInterval=20., closedMarketInterval=100.)
+        poller.subscribe('FOO', lambda symbol, price: delivered.append((symbol, price)))
+        poller.subscribe('BAR', lambda symbol, price: delivered.append((symbol, price)))
+
+        with mock.patch('yahoo.sendRequest', sendRequest):
+
+            self.assertEqual(poller.poll(now=0.), 2)
+            self.assertEqual(requests, [['FOO', 'BAR']])
+            self.assertEqual(delivered, [('FOO', Price(1., 'GBP')), ('BAR', Price(2., 'GBP'))])
+
+            # FOO is polled again after the minimum interval, its unchanged price is not delivered and its interval doubles.
+            self.assertEqual(poller.poll(now=4.), 0)
+            self.assertEqual(poller.poll(now=5.), 0)
+            self.assertEqual(requests[-1], ['FOO'])
+            self.assertEqual(poller.poll(now=14.), 0)
+            self.assertEqual(len(requests), 2)
+
+            # Changed prices are delivered and reset the interval; BAR, whose market is closed, is not polled yet.
+            prices['FOO'] = 1.5
+            self.assertEqual(poller.poll(now=15.), 1)
+            self.assertEqual(requests[-1], ['FOO'])
+            self.assertEqual(delivered[-1], ('FOO', Price(1.5, 'GBP')))
+
+            # A callback subscribed to an already polled symbol receives its last known price right away.
+            added = []
+            poller.subscribe('FOO', lambda symbol, price: added.append((symbol, price)))
+            self.assertEqual(added, [('FOO', Price(1.5, 'GBP'))])
+
+            poller.unsubscribe('FOO')
+            self.assertEqual(poller.poll(now=100.), 0)
+            self.assertEqual(requests[-1], ['BAR'])
+
+    def test_pollFallback(self):
+
+        """
+        Validate that symbols missing from the quote endpoint are polled from their chart, whose trading period tells whether
+        their market is open, and that failures are reported once to the subscribers, or warned about.
+        """
+
+        def sendRequest(URL, useCache=True):
+            if '/v7/finance/quote' in URL:
+                return {'quoteResponse': {'result': []}}
+            if '/chart/FAIL' in URL:
+                raise requests.HTTPError('404 Client Error')
+            return {'chart': {'result': [{'meta': {
+                'regularMarketPrice': 1., 'currency': 'GBP', 'currentTradingPeriod': {'regular': {'start': 1000, 'end': 2000}}
+            }}]}}
+
+        delivered, errors = [], []
+        poller = PricePoller(minInterval=5., maxInterval=20., closedMarketInterval=100.)
+        poller.subscribe('FOO', lambda symbol, price: delivered.append((symbol, price)))
+        poller.subscribe('FAIL', lambda symbol, price: None, lambda symbol, error: errors.append((symbol, error)))
+
+        with mock.patch('yahoo.sendRequest', sendRequest), mock.patch('time.time', return_value=1500.):
+            self.assertEqual(poller.poll(now=0.), 1)
+            self.assertEqual(delivered, [('FOO', Price(1., 'GBP'))])
+            self.assertEqual([(symbol, type(error)) for symbol, error in errors], [('FAIL', requests.HTTPError)])
+
+            # Failures are only reported when a symbol starts failing, and failing symbols are polled less and less often.
+            self.assertEqual(poller.poll(now=10.), 0)
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(poller._subscriptions['FAIL'].interval, 20.)
+
+            # Outside of its trading period, a symbol is polled after the closed market interval.
+            with mock.patch('time.time', return_value=2500.):
+                poller.poll(now=20.)
+            self.assertEqual(poller._subscriptions['FOO'].nextPoll, 120.)
+
+        with mock.patch('yahoo.sendRequest', sendRequest), self.assertWarns(UserWarning):
+            poller = PricePoller()
+            poller.subscribe('FAIL', lambda symbol, price: None)
+            poller.poll(now=0.)
+
+    def test_start(self):
+
+        """Validate that the background thread delivers prices until stopped."""
+
+        delivered = threading.Event()
+        response = {'quoteResponse': {'result': [{'symbol': 'FOO', 'regularMarketPrice': 1., 'currency': 'GBP'}]}}
+
+        with mock.patch('yahoo.sendRequest', return_value=response):
+            poller = PricePoller()
+            poller.start()
+            poller.subscribe('FOO', lambda symbol, price: delivered.set())
+            self.assertTrue(delivered.wait(5))
+            poller.stop()
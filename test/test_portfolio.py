@@ -0,0 +1,74 @@
+import datetime
+from unittest import TestCase
+import mock
+from order import Order, OrderDirection
+from portfolio import CostBasisMethod, Portfolio
+from price import Price
+from test.test_currency import _createConverter
+
+
+def _createOrder(direction, quantity, value, currency, date, fee=None):
+    return Order(
+        symbol='SWDA.L',
+        direction=direction,
+        quantity=quantity,
+        price=Price(value, currency),
+        fee=Price(fee, currency) if fee is not None else None,
+        date=date
+    )
+
+
+class TestPortfolio(TestCase):
+
+    def test_fifo(self):
+
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+
+            portfolio = Portfolio('EUR')
+            portfolio.update([
+                _createOrder(OrderDirection.Buy, 10, 10., 'EUR', datetime.date(2010, 5, 7), fee=1.),
+                _createOrder(OrderDirection.Buy, 10, 20., 'EUR', datetime.date(2010, 5, 10)),
+            ])
+            portfolio.update([_createOrder(OrderDirection.Sell, 15, 30., 'EUR', datetime.date(2010, 5, 11), fee=2.)])
+
+            position = portfolio.getPositions()['SWDA.L']
+            self.assertAlmostEqual(position.quantity, 5)
+            self.assertAlmostEqual(position.cost.value, 100.)
+            self.assertAlmostEqual(position.averageCost.value, 20.)
+            self.assertAlmostEqual(position.realisedProfit.value, 450. - 2. - (101. + 100.))
+
+            # Prices are converted into the base currency, at the rate of the order date or the latest before it.
+            portfolio.update([_createOrder(OrderDirection.Buy, 1, 0.8616, 'GBP', datetime.date(2010, 5, 12))])
+            self.assertAlmostEqual(portfolio.getPositions()['SWDA.L'].cost.value, 101.)
+
+            with self.assertRaises(RuntimeError):
+                portfolio.update([_createOrder(OrderDirection.Buy, 1, 1., 'EUR', datetime.date(2010, 5, 7))])
+            with self.assertRaises(RuntimeError):
+                portfolio.update([_createOrder(OrderDirection.Sell, 7, 1., 'EUR', datetime.date(2010, 5, 12))])
+            with self.assertRaises(RuntimeError):
+                portfolio.update([_createOrder(OrderDirection.Buy, 1, 1., 'YEET', datetime.date(2010, 5, 12))])
+
+            # A failed batch leaves the portfolio unchanged, including the orders preceding the failing one.
+            with self.assertRaises(RuntimeError):
+                portfolio.update([
+                    _createOrder(OrderDirection.Buy, 5, 1., 'EUR', datetime.date(2010, 5, 12)),
+                    _createOrder(OrderDirection.Sell, 20, 1., 'EUR', datetime.date(2010, 5, 13)),
+                ])
+            with self.assertRaises(RuntimeError):
+                portfolio.update([_createOrder(OrderDirection.Buy, 0, 1., 'EUR', datetime.date(2010, 5, 12))])
+            self.assertAlmostEqual(portfolio.getPositions()['SWDA.L'].quantity, 6)
+            self.assertEqual(str(portfolio.lastDate), '2010-05-12')
+
+    def test_average(self):
+
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+
+            portfolio = Portfolio('EUR', method=CostBasisMethod.Average)
+            for index in range(20):
+                portfolio.update([_createOrder(OrderDirection.Buy, 1, 10. + index, 'EUR', datetime.date(2010, 5, 7))])
+            portfolio.update([_createOrder(OrderDirection.Sell, 10, 20., 'EUR', datetime.date(2010, 5, 10))])
+
+            position = portfolio.getPositions()['SWDA.L']
+            self.assertAlmostEqual(position.quantity, 10)
+            self.assertAlmostEqual(position.averageCost.value, 19.5)
+            self.assertAlmostEqual(position.realisedProfit.value, 200. - 195.)
@@ -1,6 +1,9 @@
-from datetime import date
+from datetime import date, timedelta
 from unittest import TestCase
-from price import Price
+import mock
+import numpy
+from price import Price, PriceArray
+from test.test_currency import _createConverter
 
 
 class TestPrice(TestCase):
@@ -13,4 +16,49 @@ class TestPrice(TestCase):
             Price(1, 'USD').convert('GBP', date=date(2010, 5, 7)),
             Price(0.681037188137455, 'GBP')
         )
-        
\ No newline at end of file
+        
+
+    def test_convertBatch(self):
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+            prices, missing = Price.convertBatch([Price(1, 'USD'), Price(1, 'YEET')], 'GBP', dates=[date(2010, 5, 7)] * 2)
+        self.assertEqual(prices, [Price(0.8667 / 1.2727, 'GBP'), None])
+        self.assertEqual(list(missing), [False, True])
+
+    def test_convertHistory(self):
+        history = {date(2010, 5, 7): Price(1, 'USD'), date(2010, 5, 8): Price(2, 'USD'), date(2010, 5, 16): Price(3, 'USD')}
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+            self.assertEqual(
+                Price.convertHistory(history, 'GBP', maxStaleness=timedelta(days=3)),
+                {
+                    date(2010, 5, 7): Price(0.8667 / 1.2727, 'GBP'),
+                    date(2010, 5, 8): Price(2 * (0.8667 / 1.2727), 'GBP'),
+                    date(2010, 5, 16): None,
+                }
+            )
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Price(1, 'USD').foo = 'bar'
+
+    def test_priceArray(self):
+        prices = PriceArray.fromPrices([Price(1, 'USD'), Price(2, 'USD'), Price(3, 'USD')])
+        self.assertEqual(len(prices), 3)
+        self.assertEqual(prices[1], Price(2, 'USD'))
+        self.assertEqual(list(prices[1:]), [Price(2, 'USD'), Price(3, 'USD')])
+        self.assertEqual(list((prices + Price(1, 'USD')).values), [2, 3, 4])
+        self.assertEqual(list((2 * prices - prices).values), [1, 2, 3])
+        self.assertEqual(list(prices / prices), [1, 1, 1])
+        self.assertEqual(list(prices > Price(1.5, 'USD')), [False, True, True])
+        self.assertEqual(list(prices == PriceArray([1, 0, 3], 'USD')), [True, False, True])
+        self.assertEqual(prices.sum(), Price(6, 'USD'))
+        self.assertEqual(prices.max(), Price(3, 'USD'))
+        with self.assertRaises(RuntimeError):
+            _ = prices + Price(1, 'GBP')
+        with self.assertRaises(RuntimeError):
+            _ = PriceArray.fromPrices([Price(1, 'USD'), Price(1, 'GBP')])
+
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()):
+            converted = prices.convert('GBP', dates=[date(2010, 5, 7), date(2010, 5, 8), date(2010, 5, 10)])
+        self.assertEqual(converted.currency, 'GBP')
+        self.assertEqual(converted[0], Price(0.8667 / 1.2727, 'GBP'))
+        self.assertTrue(numpy.isnan(converted.values[1]))
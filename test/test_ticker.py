@@ -1,12 +1,42 @@
+import asyncio
 from datetime import date, datetime
 from unittest import TestCase
 import mock
+import numpy
+import requests
+import tempfile
+import threading
+import time
+from history import DiskHistoryStore
 from price import Price
-from ticker import Ticker, validateSymbol, AmbiguousTickerException, TickerNotFoundException
+import ticker
+from ticker import Ticker, getPrices, loadHistories, validateSymbol, validateSymbols, AmbiguousTickerException, TickerNotFoundException
+
+
+def _getPeriods(URL):
+    parameters = dict(parameter.split('=') for parameter in URL.split('?')[1].split('&'))
+    return int(parameters['period1']), int(parameters['period2'])
+
+
+def _createHistoryResponse(URL):
+
+    """Returns a history response for the interval requested by the URL, with one close per day, equal to its day of the month."""
+
+    period1, period2 = _getPeriods(URL)
+    timestamps = list(range(period1 + 43200, period2, 86400))
+    return {'chart': {'result': [{
+        'meta': {'currency': 'GBP'},
+        'timestamp': timestamps,
+        'indicators': {'quote': [{'close': [datetime.fromtimestamp(timestamp).day for timestamp in timestamps]}]}
+    }]}}
 
 
 class TestTicker(TestCase):
-    
+
+    def setUp(self):
+        ticker.HISTORY_STORE.clear()
+        ticker.SYMBOL_REGISTRY.clear()
+
     def test_getPrice(self):
 
         """Validate that a ticker's history can be retreieved."""
@@ -57,6 +87,177 @@ class TestTicker(TestCase):
             )
 
 
+    def test_getHistoryColumnar(self):
+
+        """Validate that a ticker's history can be retrieved as a table, including the open, high, low and volume."""
+
+        response = {
+            'chart': {
+                'result': [
+                    {
+                        'meta': {'currency': 'GBP'},
+                        'timestamp': [1638101809, 1638188191, 1638274561],
+                        'indicators': {'quote': [{
+                            'open': [1.5, None, 2.5],
+                            'high': [2, None, 3.5],
+                            'low': [0.5, None, 2],
+                            'close': [1, None, 30],
+                            'volume': [100, None, 300],
+                        }]}
+                    },
+                ]
+            }
+        }
+
+        with mock.patch('yahoo.sendRequest', return_value=response), mock.patch('ticker.validateSymbol'):
+
+            history = Ticker('YEET').getHistory(date(2021, 11, 28), date(2021, 11, 30), columnar=True)
+
+        self.assertEqual(history.attrs['currency'], 'GBP')
+        self.assertEqual([index.date() for index in history.index], [date(2021, 11, 28), date(2021, 11, 30)])
+        self.assertEqual(history.to_dict('list'), {'open': [1.5, 2.5], 'high': [2, 3.5], 'low': [0.5, 2], 'close': [1, 3], 'volume': [100, 300]})
+
+    def test_getHistoryIncremental(self):
+
+        """Validate that only the parts of an interval which were not previously retrieved are requested."""
+
+        requestedIntervals = []
+
+        def sendRequest(URL, *args, **kwargs):
+            requestedIntervals.append(tuple(datetime.fromtimestamp(period).date() for period in _getPeriods(URL)))
+            return _createHistoryResponse(URL)
+
+        with mock.patch('yahoo.sendRequest', sendRequest), mock.patch('ticker.validateSymbol'):
+
+            yeet = Ticker('YEET')
+            self.assertEqual(len(yeet.getHistory(date(2021, 1, 10), date(2021, 1, 19))), 10)
+            self.assertEqual(len(yeet.getHistory(date(2021, 1, 1), date(2021, 1, 31))), 31)
+            self.assertEqual(yeet.getHistory(date(2021, 1, 14), date(2021, 1, 15)), {date(2021, 1, 14): Price(14, 'GBP'), date(2021, 1, 15): Price(15, 'GBP')})
+
+        self.assertEqual(requestedIntervals, [
+            (date(2021, 1, 10), date(2021, 1, 20)),
+            (date(2021, 1, 1), date(2021, 1, 10)),
+            (date(2021, 1, 20), date(2021, 2, 1)),
+        ])
+        self.assertEqual(ticker.HISTORY_STORE.getRanges('YEET'), [(date(2021, 1, 1), date(2021, 1, 31))])
+
+    def test_getHistoryLastValueCorrection(self):
+
+        """Validate that the last close of a single-date gap is checked against the held close preceding it."""
+
+        ticker.HISTORY_STORE.add('YEET', 'GBP', {'date': numpy.array(['2021-01-14'], dtype='datetime64[D]'), 'close': numpy.array([14.])}, date(2021, 1, 1), date(2021, 1, 14))
+        response = {'chart': {'result': [{
+            'meta': {'currency': 'GBP'},
+            'timestamp': [int(datetime(2021, 1, 15, 12).timestamp())],
+            'indicators': {'quote': [{'close': [1500.]}]}
+        }]}}
+
+        with mock.patch('yahoo.sendRequest', return_value=response), mock.patch('ticker.validateSymbol'):
+            self.assertEqual(Ticker('YEET').getHistory(date(2021, 1, 14), date(2021, 1, 15)), {date(2021, 1, 14): Price(14, 'GBP'), date(2021, 1, 15): Price(15, 'GBP')})
+
+    def test_loadHistories(self):
+
+        """Validate that histories are loaded in bulk into a disk store, resuming from the held ranges, and read back offline."""
+
+        requestedSymbols = []
+
+        def sendRequest(URL, *args, **kwargs):
+            symbol = URL.split('/chart/')[1].split('?')[0]
+            if symbol == 'YEET':
+                raise requests.HTTPError('404 Client Error')
+            requestedSymbols.append(symbol)
+            return _createHistoryResponse(URL)
+
+        with tempfile.TemporaryDirectory() as directory, mock.patch('yahoo.sendRequest', sendRequest):
+
+            errors = loadHistories(['FOO', 'BAR', 'YEET'], date(2021, 1, 1), date(2021, 1, 31), store=DiskHistoryStore(directory))
+            self.assertEqual(list(errors), ['YEET'])
+            self.assertEqual(sorted(requestedSymbols), ['BAR', 'FOO'])
+
+            loadHistories(['FOO', 'BAR'], date(2021, 1, 1), date(2021, 1, 31), store=DiskHistoryStore(directory))
+            self.assertEqual(len(requestedSymbols), 2)
+
+            try:
+                ticker.setHistoryStore(directory)
+                with mock.patch('ticker.validateSymbol', side_effect=AssertionError):
+                    history = Ticker('FOO', lazy=True).getHistory(date(2021, 1, 14), date(2021, 1, 15), offline=True)
+                self.assertEqual(history, {date(2021, 1, 14): Price(14, 'GBP'), date(2021, 1, 15): Price(15, 'GBP')})
+            finally:
+                ticker.setHistoryStore(None)
+
+    def test_async(self):
+
+        """Validate that prices, histories and validations can be awaited concurrently."""
+
+        def sendRequest(URL, *args, **kwargs):
+            if '/finance/search' in URL:
+                symbol = URL.split('q=')[1].split('&')[0]
+                return {'quotes': [{'symbol': symbol}]}
+            if 'range=1d' in URL:
+                return {'chart': {'result': [{'meta': {'currency': 'GBP', 'regularMarketPrice': len(URL)}}]}}
+            return {'chart': {'result': [{'meta': {'currency': 'GBP'}, 'timestamp': [1638101809], 'indicators': {'quote': [{'close': [1]}]}}]}}
+
+        async def getValues(symbols):
+            tickers = await asyncio.gather(*(Ticker.createAsync(symbol) for symbol in symbols))
+            prices = await asyncio.gather(*(ticker.getPriceAsync() for ticker in tickers))
+            histories = await asyncio.gather(*(ticker.getHistoryAsync(date(2021, 11, 28), date(2021, 11, 28)) for ticker in tickers))
+            return tickers, prices, histories
+
+        # The history store is written off the thread running the event loop.
+        storingThreads = set()
+        add = ticker.HISTORY_STORE.add
+
+        def addHistory(*args, **kwargs):
+            storingThreads.add(threading.current_thread())
+            return add(*args, **kwargs)
+
+        with mock.patch('yahoo.sendRequest', sendRequest), mock.patch('yahoo.aiohttp', None), mock.patch.object(ticker.HISTORY_STORE, 'add', addHistory):
+            tickers, prices, histories = asyncio.run(getValues(['A', 'BB', 'CCC']))
+            self.assertTrue(storingThreads)
+            self.assertNotIn(threading.current_thread(), storingThreads)
+
+            with self.assertRaises(AmbiguousTickerException):
+                asyncio.run(Ticker.createAsync('A&B'))
+
+        self.assertEqual([ticker.symbol for ticker in tickers], ['A', 'BB', 'CCC'])
+        self.assertEqual([price.currency for price in prices], ['GBP'] * 3)
+        self.assertEqual(len({price.value for price in prices}), 3)
+        self.assertEqual(histories, [{date(2021, 11, 28): Price(1, 'GBP')}] * 3)
+
+    def test_getPrices(self):
+
+        """Validate that prices are requested in batches, falling back to single requests for symbols missing from them."""
+
+        requestedURLs = []
+
+        def sendRequest(URL, *args, **kwargs):
+            requestedURLs.append(URL)
+            if '/v7/finance/quote' in URL:
+                symbols = URL.split('symbols=')[1].split(',')
+                return {'quoteResponse': {'result': [
+                    {'symbol': symbol, 'regularMarketPrice': float(symbol[1:]), 'currency': 'GBP'}
+                    for symbol in symbols if symbol.startswith('S') and symbol != 'S1'
+                ]}}
+            if '/v8/finance/chart/S1?' in URL:
+                return {'chart': {'result': [{'meta': {'currency': 'USD', 'regularMarketPrice': 1.}}]}}
+            raise requests.HTTPError('404 Client Error')
+
+        symbols = [f'S{index}' for index in range(1000)]
+
+        with mock.patch('yahoo.sendRequest', sendRequest), mock.patch('ticker.MAX_URL_LENGTH', 1000):
+            prices, errors = getPrices(symbols + ['YEET'])
+
+        self.assertEqual(len(prices), 1000)
+        self.assertEqual(prices['S1'], Price(1., 'USD'))
+        self.assertEqual(prices['S999'], Price(999., 'GBP'))
+        self.assertEqual(list(errors), ['YEET'])
+        self.assertIsInstance(errors['YEET'], requests.HTTPError)
+
+        batchURLs = [URL for URL in requestedURLs if '/v7/finance/quote' in URL]
+        self.assertTrue(all(len(URL) <= 1000 for URL in batchURLs))
+        self.assertEqual(len(batchURLs), 6)
+        self.assertEqual(len(requestedURLs), len(batchURLs) + 2)
+
     def test_validation(self):
 
         """Tests various scenarios of validation of a ticker symbol."""
@@ -96,4 +297,39 @@ class TestTicker(TestCase):
             with self.assertRaises(TickerNotFoundException):
                 validateSymbol('D')
 
+    def test_validationRegistry(self):
+
+        """Tests that validation outcomes, including failed ones, are remembered, deferred and requested in bulk."""
+
+        searchedSymbols = []
+
+        def sendRequest(URL, *args, **kwargs):
+            symbol = URL.split('q=')[1].split('&')[0]
+            searchedSymbols.append(symbol)
+            return {'quotes': [{'symbol': symbol}] if symbol != 'D' else []}
+
+        with mock.patch('yahoo.sendRequest', sendRequest):
+
+            Ticker('A')
+            Ticker('A')
+            for _ in range(2):
+                with self.assertRaises(TickerNotFoundException):
+                    Ticker('D')
+            self.assertEqual(searchedSymbols, ['A', 'D'])
+
+            # A lazy ticker is only validated when first used;
+            lazyTicker = Ticker('D', lazy=True)
+            ticker.SYMBOL_REGISTRY.clear()
+            self.assertEqual(searchedSymbols, ['A', 'D'])
+            with self.assertRaises(TickerNotFoundException):
+                lazyTicker.getPrice()
+            self.assertEqual(searchedSymbols, ['A', 'D', 'D'])
+
+            errors = validateSymbols(['A', 'B', 'C', 'D'])
+            self.assertEqual(list(errors), ['D'])
+            self.assertIsInstance(errors['D'], TickerNotFoundException)
+            self.assertEqual(sorted(searchedSymbols), ['A', 'A', 'B', 'C', 'D', 'D'])
 
+            with mock.patch('time.monotonic', return_value=time.monotonic() + ticker.SYMBOL_REGISTRY_TTL):
+                validateSymbol('B')
+            self.assertEqual(searchedSymbols.count('B'), 2)
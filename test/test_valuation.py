@@ -0,0 +1,73 @@
+import datetime
+from unittest import TestCase
+import mock
+import requests
+from order import Order, OrderDirection
+from price import Price
+import ticker
+from valuation import getPortfolioValues
+from test.test_currency import _createConverter
+
+
+class TestValuation(TestCase):
+
+    def setUp(self):
+        ticker.HISTORY_STORE.clear()
+
+    def test_getPortfolioValues(self):
+
+        """
+        Validate that holdings are valued daily from closes carried over non-trading days and converted at the rate of each
+        day, that positions closed before the interval are not requested, that symbols are not validated and that failed requests
+        are reported by symbol.
+        """
+
+        response = {
+            'chart': {
+                'result': [
+                    {
+                        'meta': {'currency': 'USD'},
+                        'timestamp': [1273233600, 1273579200],
+                        'indicators': {'quote': [{'close': [10., 20.]}]}
+                    },
+                ]
+            }
+        }
+
+        orders = [
+            Order(symbol='YEET', direction=OrderDirection.Buy, quantity=3, price=Price(10., 'USD'), fee=None, date=datetime.date(2010, 5, 1)),
+            Order(symbol='YEET', direction=OrderDirection.Sell, quantity=1, price=Price(10., 'USD'), fee=None, date=datetime.date(2010, 5, 10)),
+            Order(symbol='CLOSED', direction=OrderDirection.Buy, quantity=1, price=Price(10., 'USD'), fee=None, date=datetime.date(2010, 5, 1)),
+            Order(symbol='CLOSED', direction=OrderDirection.Sell, quantity=1, price=Price(10., 'USD'), fee=None, date=datetime.date(2010, 5, 2)),
+        ]
+        failing = Order(symbol='FAIL', direction=OrderDirection.Buy, quantity=1, price=Price(10., 'USD'), fee=None, date=datetime.date(2010, 5, 10))
+
+        requestedSymbols = []
+
+        def sendRequest(URL, *args, **kwargs):
+            symbol = URL.split('/chart/')[1].split('?')[0]
+            requestedSymbols.append(symbol)
+            if symbol == 'FAIL':
+                raise requests.HTTPError('404 Client Error')
+            return response
+
+        with mock.patch('currency.CURRENCY_CONVERTER', _createConverter()), mock.patch('yahoo.sendRequest', sendRequest), mock.patch('ticker.validateSymbol', side_effect=AssertionError):
+
+            values, errors = getPortfolioValues(orders, datetime.date(2010, 5, 7), datetime.date(2010, 5, 11), 'GBP')
+
+            self.assertEqual(errors, {})
+            self.assertNotIn('CLOSED', requestedSymbols)
+            self.assertEqual(list(values), [datetime.date(2010, 5, day) for day in (7, 8, 9, 10, 11)])
+            expected = [30 * 0.8667 / 1.2727] * 3 + [20 * 0.8645 / 1.2942, 40 * 0.8616 / 1.2727]
+            for date, value in zip(values, expected):
+                self.assertEqual(values[date].currency, 'GBP')
+                self.assertAlmostEqual(values[date].value, value)
+
+            series, _ = getPortfolioValues(orders, datetime.date(2010, 5, 7), datetime.date(2010, 5, 11), 'GBP', columnar=True)
+            self.assertEqual(series.attrs['currency'], 'GBP')
+            self.assertAlmostEqual(series.iloc[-1], expected[-1])
+
+            series, errors = getPortfolioValues(orders + [failing], datetime.date(2010, 5, 7), datetime.date(2010, 5, 11), 'GBP', columnar=True)
+            self.assertEqual(list(errors), ['FAIL'])
+            self.assertAlmostEqual(series.iloc[0], expected[0])
+            self.assertTrue(series.iloc[3:].isna().all())
@@ -1,9 +1,61 @@
+import asyncio
 from datetime import date, datetime
-from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, skipUnless
 import mock
+import requests
+import yahoo
 from yahoo import sendRequest
 
 
+class _YahooServer(object):
+
+    """
+    A local HTTP stand-in for the Yahoo Finance API: each request is answered with the next of the
+    given responses (status code and JSON content), repeating the last one once exhausted.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests.append((self.path, self.client_address))
+                status, content = server.responses[min(len(server.requests), len(server.responses)) - 1]
+                body = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpServer = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.URL = f'http://127.0.0.1:{self.httpServer.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpServer.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
+
+
 class TestYahoo(TestCase):
 
     def test_sendRequest(self):
@@ -25,4 +77,169 @@ class TestYahoo(TestCase):
             sendRequest('https://foo.com/api/v1/yeet', useCache=False)
             self.assertTrue(send.called)
             self.assertFalse(cache.called)
-        
\ No newline at end of file
+        
+
+    def test_retry(self):
+
+        # Validate that throttled and failed requests are retried and that connections are reused.
+        yahoo.configure(backoffFactor=0.01, maxRetries=3)
+        try:
+            with _YahooServer([(429, {}), (503, {}), (200, {'yeet': 42})]) as server:
+                self.assertEqual(yahoo._doSendRequest(f'{server.URL}/v8/finance/chart/YEET'), {'yeet': 42})
+                self.assertEqual(len(server.requests), 3)
+                self.assertEqual(len({address for _, address in server.requests}), 1)
+
+            # Validate that the error is raised once the retries are exhausted.
+            with _YahooServer([(500, {})]) as server:
+                with self.assertRaises(requests.HTTPError):
+                    yahoo._doSendRequest(f'{server.URL}/v8/finance/chart/YEET')
+                self.assertEqual(len(server.requests), 4)
+
+            # Validate that other error responses are raised right away and never cached.
+            with _YahooServer([(404, {'chart': {'result': None, 'error': {'code': 'Not Found'}}})]) as server:
+                URL = f'{server.URL}/v8/finance/chart/YEET'
+                with self.assertRaises(requests.HTTPError):
+                    sendRequest(URL)
+                self.assertEqual(len(server.requests), 1)
+                self.assertFalse(yahoo._hasCache(URL))
+        finally:
+            yahoo.configure(backoffFactor=0.5, maxRetries=4)
+
+    def test_rateLimit(self):
+
+        # Validate that, once the burst is consumed, requests are throttled to the given rate.
+        bucket = yahoo._TokenBucket(rate=50., capacity=2)
+        start = time.monotonic()
+        for _ in range(7):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_cache(self):
+
+        # Validate the time-to-live of the different endpoints.
+        now = int(time.time())
+        self.assertEqual(yahoo.getTimeToLive('https://foo.com/v8/finance/chart/YEET?interval=1m&range=1d'), yahoo.QUOTE_TTL)
+        self.assertEqual(yahoo.getTimeToLive(f'https://foo.com/v8/finance/chart/YEET?period1=0&period2={now - 7 * 86400}'), yahoo.CLOSED_HISTORY_TTL)
+        self.assertEqual(yahoo.getTimeToLive(f'https://foo.com/v8/finance/chart/YEET?period1=0&period2={now + 86400}'), yahoo.OPEN_HISTORY_TTL)
+        self.assertEqual(yahoo.getTimeToLive('https://foo.com/v1/finance/search?q=YEET'), yahoo.SEARCH_TTL)
+
+        # Validate that the least recently used entries are evicted and expired ones are not returned.
+        cache = yahoo._ResponseCache(maxSize=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        self.assertTrue(cache.has('a'))
+        cache.set('c', 3, 60)
+        self.assertFalse(cache.has('b'))
+        self.assertEqual(cache.get('a'), 1)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 120):
+            self.assertFalse(cache.has('c'))
+        self.assertEqual(cache.getStats(), {'size': 1, 'hits': 1, 'misses': 2, 'evictions': 1, 'expirations': 1})
+
+        # Validate that responses requested without storing them are kept out of the cache.
+        yahoo.clearCache()
+        with mock.patch('yahoo._doSendRequest', return_value={}):
+            sendRequest('https://foo.com/api/v1/unstored', useCache=False, store=False)
+        self.assertEqual(yahoo.getCacheStats()['size'], 0)
+
+    def test_coalescing(self):
+
+        # Validate that concurrent requests for the same URL send a single request and share its response.
+        def doSendRequest(URL):
+            time.sleep(0.2)
+            return {'URL': URL}
+
+        with mock.patch('yahoo._doSendRequest', side_effect=doSendRequest) as send, ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(lambda _: sendRequest('https://foo.com/api/v1/coalesced'), range(8)))
+            self.assertEqual(send.call_count, 1)
+            self.assertEqual(responses, [{'URL': 'https://foo.com/api/v1/coalesced'}] * 8)
+
+        # Validate that the error of a request is raised to all callers waiting for it.
+        def doSendRequest(URL):
+            time.sleep(0.2)
+            raise requests.ConnectionError('yeet')
+
+        with mock.patch('yahoo._doSendRequest', side_effect=doSendRequest) as send, ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(sendRequest, 'https://foo.com/api/v1/failing') for _ in range(4)]
+            for future in futures:
+                self.assertIsInstance(future.exception(), requests.ConnectionError)
+            self.assertEqual(send.call_count, 1)
+
+    @skipUnless(yahoo.aiohttp, 'aiohttp is not installed')
+    def test_sendRequestAsync(self):
+
+        # Validate that asynchronous requests are retried and that concurrent ones for the same URL are coalesced.
+        async def sendRequests(URL):
+            try:
+                return await asyncio.gather(*(yahoo.sendRequestAsync(URL) for _ in range(3)))
+            finally:
+                await yahoo.closeAsyncSession()
+
+        yahoo.clearCache()
+        with _YahooServer([(503, {}), (200, {'a': 1})]) as server, mock.patch('yahoo.BACKOFF_FACTOR', 0.):
+            responses = asyncio.run(sendRequests(f'{server.URL}/v8/finance/chart/A?range=1d'))
+        self.assertEqual(responses, [{'a': 1}] * 3)
+        self.assertEqual(len(server.requests), 2)
+
+        # Validate that the persistent cache is read and written off the thread running the event loop.
+        with tempfile.TemporaryDirectory() as directory:
+            yahoo.setPersistentCache(os.path.join(directory, 'yahoo.sqlite'))
+            try:
+                cache, cachingThreads = yahoo._PERSISTENT_CACHE, set()
+
+                def recordThread(method):
+                    def call(*args):
+                        cachingThreads.add(threading.current_thread())
+                        return method(*args)
+                    return call
+
+                with mock.patch.object(cache, 'get', recordThread(cache.get)), mock.patch.object(cache, 'set', recordThread(cache.set)):
+                    yahoo.clearCache()
+                    with _YahooServer([(200, {'a': 1})]) as server:
+                        asyncio.run(sendRequests(f'{server.URL}/v8/finance/chart/A?range=1d'))
+                self.assertEqual(cache.get(f'{server.URL}/v8/finance/chart/A?range=1d')[0], {'a': 1})
+                self.assertTrue(cachingThreads)
+                self.assertNotIn(threading.current_thread(), cachingThreads)
+            finally:
+                yahoo.setPersistentCache(None)
+
+    def test_persistentCache(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            path = os.path.join(directory, 'yahoo.sqlite')
+            URL = 'https://foo.com/v1/finance/search?q=PERSISTED'
+
+            # Validate that a response cached by one process is available to others until it expires.
+            yahoo._PersistentCache(path).set(URL, {'quotes': [{'symbol': 'PERSISTED'}]}, 60)
+            response, timeToLive = yahoo._PersistentCache(path).get(URL)
+            self.assertEqual(response, {'quotes': [{'symbol': 'PERSISTED'}]})
+            self.assertTrue(0 < timeToLive <= 60)
+            cache = yahoo._PersistentCache(path)
+            with mock.patch('time.time', return_value=time.time() + 120):
+                self.assertIsNone(cache.get(URL))
+
+            # Validate that requests are served from the persistent cache once the in-memory one is empty.
+            yahoo.setPersistentCache(path)
+            try:
+                yahoo.clearCache()
+                with mock.patch('yahoo._doSendRequest') as send:
+                    self.assertEqual(sendRequest(URL), {'quotes': [{'symbol': 'PERSISTED'}]})
+                    self.assertFalse(send.called)
+
+                with mock.patch('yahoo._doSendRequest', return_value={'quotes': []}) as send:
+                    sendRequest('https://foo.com/v1/finance/search?q=MISSING')
+                    self.assertTrue(send.called)
+                self.assertEqual(yahoo._PersistentCache(path).get('https://foo.com/v1/finance/search?q=MISSING')[0], {'quotes': []})
+            finally:
+                yahoo.setPersistentCache(None)
+
+            # Validate that expired responses are purged when the cache is opened and every so many stored responses.
+            countResponses = lambda: cache._getConnection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            with mock.patch('time.time', return_value=time.time() + 120):
+                yahoo._PersistentCache(path)
+            self.assertEqual(countResponses(), 1)
+            with mock.patch('yahoo.PERSISTENT_CACHE_PURGE_INTERVAL', 2):
+                cache.set('https://foo.com/v1/finance/search?q=EXPIRED', {'quotes': []}, -1)
+                self.assertEqual(countResponses(), 2)
+                cache.set('https://foo.com/v1/finance/search?q=EXPIRED', {'quotes': []}, -1)
+                self.assertEqual(countResponses(), 1)
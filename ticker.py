@@ -1,23 +1,83 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import datetime
 import math
+import threading
+import time
+from urllib.parse import quote
+import numpy
+from history import DiskHistoryStore, HistoryStore
 from price import Price
 import yahoo
 
 
+# The maximum number of dates held in the HISTORY_STORE across all tickers, beyond which the
+# histories of the least recently used tickers are evicted;
+HISTORY_STORE_MAX_SIZE = 1000000
+
+HISTORY_STORE = HistoryStore(HISTORY_STORE_MAX_SIZE)
+
+# For how long, in seconds, the outcome of the search for a symbol is remembered when validating it;
+SYMBOL_REGISTRY_TTL = 24 * 60 * 60.
+
+# The maximum length of the URLs of batch quote requests, beyond which symbols are split into
+# several requests;
+MAX_URL_LENGTH = 2000
+
+
+Quotes = namedtuple('Quotes', ['prices', 'errors'])
+Quotes.__doc__ = """
+The result of a batch price request: the prices by symbol, alongside the errors by symbol for
+those whose price could not be retrieved.
+"""
+
+
 class Ticker:
 
-    def __init__(self, symbol):
+    def __init__(self, symbol, lazy=False):
         """
         Initialises a ticker given its symbol.
 
+        Parameters
+        ----------
+            symbol: str
+            lazy: bool
+                If set, the validation of the symbol is deferred until the ticker is first used.
+
         Raises
         ------
             TickerException
                 If the given symbol cannot uniquely identify a ticker.
         """
         self.symbol = symbol
-        validateSymbol(symbol)
+        self._isValidated = False
+        if not lazy:
+            self._validate()
+
+    @staticmethod
+    async def createAsync(symbol):
+        """
+        Asynchronous counterpart of the constructor, validating the symbol without blocking.
+
+        Return
+        ------
+            Ticker
+        """
+        ticker = Ticker(symbol, lazy=True)
+        await ticker._validateAsync()
+        return ticker
+
+    def _validate(self):
+        if not self._isValidated:
+            validateSymbol(self.symbol)
+            self._isValidated = True
+
+    async def _validateAsync(self):
+        if not self._isValidated:
+            await validateSymbolAsync(self.symbol)
+            self._isValidated = True
 
     def __repr__(self):
         return f'Ticker(symbol={self.symbol})'
@@ -32,54 +92,366 @@ class Ticker:
             Price
         """
 
-        URL = f'https://query1.finance.yahoo.com/v8/finance/chart/{self.symbol}?region=US&lang=en-US&includePrePost=false&interval=1m&useYfid=true&range=1d&corsDomain=finance.yahoo.com&.tsrc=finance'
-        response = yahoo.sendRequest(URL)   
+        self._validate()
+        return _parsePrice(yahoo.sendRequest(self._getPriceURL()))
 
-        value = response['chart']['result'][0]['meta']['regularMarketPrice']
-        currency = response['chart']['result'][0]['meta']['currency']
+    async def getPriceAsync(self):
 
-        return Price(value, currency)
+        """
+        Asynchronous counterpart of getPrice.
 
-    def getHistory(self, startDate, endDate):
+        Return
+        ------
+            Price
+        """
+
+        await self._validateAsync()
+        return _parsePrice(await yahoo.sendRequestAsync(self._getPriceURL()))
+
+    def _getPriceURL(self):
+        return _getPriceURL(self.symbol)
+
+    def getHistory(self, startDate, endDate, columnar=False, useStore=True, offline=False):
 
         """
         Returns the price at market close for the ticker for each of the dates in the specified
-        interval.
+        (inclusive) interval.
+
+        Histories are kept in the HISTORY_STORE, so that only the parts of the interval which were
+        not previously retrieved for the ticker are requested; dates from today onwards are never
+        considered as retrieved, as their values may still change.
+
+        Parameters
+        ----------
+            startDate: datetime.date
+            endDate: datetime.date
+            columnar: bool
+                If set, rather than wrapping each close in a Price, the history is returned as a
+                table indexed by date with the open, high, low, close and volume for each date and
+                whose currency is available in its 'currency' attribute.
+            useStore: bool
+                If not set, the whole interval is requested, bypassing the HISTORY_STORE.
+            offline: bool
+                If set, only the history held in the HISTORY_STORE is returned, without validating
+                the symbol nor requesting the missing parts of the interval.
+
+        Return
+        ------
+            dict[datetime.date: Price] | pandas.DataFrame
+
+        Raise
+        -----
+            KeyError
+                If offline and no history is held for the ticker.
+        """
+
+        if offline:
+            return _toHistory(*HISTORY_STORE.get(self.symbol, startDate, endDate), columnar)
+
+        self._validate()
+
+        if useStore:
+            for missingStartDate, missingEndDate in HISTORY_STORE.getMissingRanges(self.symbol, startDate, endDate):
+                response = yahoo.sendRequest(self._getHistoryURL(missingStartDate, missingEndDate))
+                self._storeHistory(missingStartDate, missingEndDate, response)
+            return _toHistory(*HISTORY_STORE.get(self.symbol, startDate, endDate), columnar)
+
+        response = yahoo.sendRequest(self._getHistoryURL(startDate, endDate))
+        return _toHistory(*_parseHistory(response, startDate, endDate), columnar)
+
+    async def getHistoryAsync(self, startDate, endDate, columnar=False, useStore=True, offline=False):
+
+        """
+        Asynchronous counterpart of getHistory, requesting the missing parts of the interval
+        concurrently; the HISTORY_STORE is read and written on the default executor of the event
+        loop, as a DiskHistoryStore would otherwise block it with file operations.
 
         Return
         ------
-            dict[datetime.date: Price]
+            dict[datetime.date: Price] | pandas.DataFrame
         """
 
-        dateToTimestamp = lambda date: int(datetime.datetime(date.year, date.month, date.day).timestamp())
-        timestampToDate = lambda timestamp: datetime.datetime.fromtimestamp(timestamp).date()
+        loop = asyncio.get_running_loop()
+
+        if offline:
+            return _toHistory(*await loop.run_in_executor(None, HISTORY_STORE.get, self.symbol, startDate, endDate), columnar)
+
+        await self._validateAsync()
+
+        if useStore:
+
+            def storeHistories(responses):
+                for (missingStartDate, missingEndDate), response in zip(missingRanges, responses):
+                    self._storeHistory(missingStartDate, missingEndDate, response)
+                return HISTORY_STORE.get(self.symbol, startDate, endDate)
+
+            missingRanges = await loop.run_in_executor(None, HISTORY_STORE.getMissingRanges, self.symbol, startDate, endDate)
+            responses = await asyncio.gather(*(yahoo.sendRequestAsync(self._getHistoryURL(*missingRange)) for missingRange in missingRanges))
+            return _toHistory(*await loop.run_in_executor(None, storeHistories, responses), columnar)
+
+        response = await yahoo.sendRequestAsync(self._getHistoryURL(startDate, endDate))
+        return _toHistory(*_parseHistory(response, startDate, endDate), columnar)
+
+    def _getHistoryURL(self, startDate, endDate):
+        return _getHistoryURL(self.symbol, startDate, endDate)
+
+    def _storeHistory(self, startDate, endDate, response):
+        _storeHistory(HISTORY_STORE, self.symbol, startDate, endDate, response)
+
+
+def _getHistoryURL(symbol, startDate, endDate):
+
+    """Returns the URL requesting the history for the given (inclusive) interval."""
+
+    dateToTimestamp = lambda date: int(datetime.datetime(date.year, date.month, date.day).timestamp())
+    return f'{yahoo.BASE_URL}/v8/finance/chart/{symbol}?symbol={symbol}&period1={dateToTimestamp(startDate)}&period2={dateToTimestamp(endDate + datetime.timedelta(days=1))}&useYfid=true&interval=1d&includePrePost=true&events=div%7Csplit%7Cearn&lang=en-GB&region=GB&crumb=1Lstoua9nzX&corsDomain=uk.finance.yahoo.com'
+
+
+def _storeHistory(store, symbol, startDate, endDate, response):
+    lastFinalDate = datetime.date.today() - datetime.timedelta(days=1)
+    currency, history = _parseHistory(response, startDate, endDate, previousClose=store.getPreviousValue(symbol, startDate))
+    store.add(symbol, currency, history, startDate, min(endDate, lastFinalDate))
+
+
+def setHistoryStore(directory):
+
+    """
+    Sets a directory as the HISTORY_STORE, persisting the histories of tickers across processes so
+    that they can be read without requesting them again, or reverts to an in-memory store if no
+    directory is provided.
+
+    Parameters
+    ----------
+        directory: str | None
+
+    Example
+    -------
+        >>> setHistoryStore(os.path.expanduser('~/.cache/pynance/history'))
+    """
+
+    global HISTORY_STORE
+    HISTORY_STORE = DiskHistoryStore(directory, HISTORY_STORE_MAX_SIZE) if directory else HistoryStore(HISTORY_STORE_MAX_SIZE)
+
+
+def loadHistories(symbols, startDate, endDate, store=None, maxWorkers=None):
+
+    """
+    Loads the histories of many tickers for the given (inclusive) interval into a store, requesting
+    them concurrently over a bounded pool of threads; only the parts of the interval the store does
+    not already hold are requested, so that an interrupted load into a DiskHistoryStore resumes
+    where it stopped when run again.
+
+    Responses are neither read from nor stored in the response caches, as the histories are held
+    by the store instead.
+
+    Symbols are not validated beforehand, as that would double the number of requests: a symbol
+    which does not exist fails its history request instead. Errors do not fail the whole load: they
+    are reported by symbol.
+
+    Parameters
+    ----------
+        symbols: list[str]
+        startDate: datetime.date
+        endDate: datetime.date
+        store: HistoryStore
+            The store to load the histories into, the HISTORY_STORE by default.
+        maxWorkers: int
+            The maximum number of concurrent requests, the size of the connection pool by default.
+
+    Return
+    ------
+        dict[str: Exception]
+
+    Example
+    -------
+        >>> loadHistories(['AAPL', 'SWDA.L', 'YEET'], datetime.date(2012, 1, 1), datetime.date(2021, 12, 31), DiskHistoryStore('history'))
+        {'YEET': HTTPError('404 Client Error: Not Found for url: ...')}
+    """
+
+    store = store if store is not None else HISTORY_STORE
+
+    def loadHistory(symbol):
+        for missingStartDate, missingEndDate in store.getMissingRanges(symbol, startDate, endDate):
+            response = yahoo.sendRequest(_getHistoryURL(symbol, missingStartDate, missingEndDate), useCache=False, store=False)
+            _storeHistory(store, symbol, missingStartDate, missingEndDate, response)
+
+    _, errors = _mapConcurrently(loadHistory, symbols, maxWorkers)
+    return errors
+
+
+def _mapConcurrently(function, symbols, maxWorkers=None):
+
+    """
+    Calls a function with each of the distinct symbols over a bounded pool of threads (the size of
+    the connection pool by default), and returns the results by symbol alongside the errors by
+    symbol for the calls which raised.
+    """
+
+    symbols = list(dict.fromkeys(symbols))
+    results, errors = {}, {}
+    if not symbols:
+        return results, errors
+
+    with ThreadPoolExecutor(max_workers=min(len(symbols), maxWorkers or yahoo.POOL_SIZE)) as executor:
+        futures = {symbol: executor.submit(function, symbol) for symbol in symbols}
 
-        URL = f'https://query1.finance.yahoo.com/v8/finance/chart/{self.symbol}?symbol={self.symbol}&period1={dateToTimestamp(startDate)}&period2={dateToTimestamp(endDate)}&useYfid=true&interval=1d&includePrePost=true&events=div%7Csplit%7Cearn&lang=en-GB&region=GB&crumb=1Lstoua9nzX&corsDomain=uk.finance.yahoo.com'
-        response = yahoo.sendRequest(URL)
+    for symbol, future in futures.items():
+        if future.exception() is not None:
+            errors[symbol] = future.exception()
+        else:
+            results[symbol] = future.result()
 
-        currency = response['chart']['result'][0]['meta']['currency']
+    return results, errors
 
-        timestamps = response['chart']['result'][0]['timestamp']
-        dates = map(timestampToDate, timestamps)
 
-        values = response['chart']['result'][0]['indicators']['quote'][0]['close']
-        datesAndValues = [(date, value) for date, value in zip(dates, values) if value is not None]
+def _getPriceURL(symbol):
+    return f'{yahoo.BASE_URL}/v8/finance/chart/{symbol}?region=US&lang=en-US&includePrePost=false&interval=1m&useYfid=true&range=1d&corsDomain=finance.yahoo.com&.tsrc=finance'
 
-        dates = [i[0] for i in datesAndValues]
-        values = [i[1] for i in datesAndValues]
 
-        # Somehow, sometimes, the last value provided is multiplied by a power of 10; the below
-        # attempts to detect when this occurs and corrects it. This would fail if the assumption
-        # that a daily market price could increase by one or more order of magnitudes does not
-        # hold (BTC I'm looking at you). This is a temporary remediation until more insight into
-        # the issue is obtained.
-        gap = round(math.log10(values[-1] / values[-2]))
-        values[-1] /= (10 ** gap)        
+def _parsePrice(response):
+    value = response['chart']['result'][0]['meta']['regularMarketPrice']
+    currency = response['chart']['result'][0]['meta']['currency']
+    return Price(value, currency)
 
-        return dict(zip(dates, map(lambda value: Price(value, currency), values)))
 
+HISTORY_FIELDS = ('open', 'high', 'low', 'close', 'volume')
 
 
+def _parseHistory(response, startDate=None, endDate=None, previousClose=None):
+
+    """
+    Parses a chart response into its currency and columns of NumPy arrays: the dates and, for each
+    of the HISTORY_FIELDS, the values; dates without a close, or outside of the given (inclusive)
+    interval, if any, are left out.
+
+    The close preceding the interval, if known (e.g. held in the HISTORY_STORE), is used to check
+    the last close when the response holds only one.
+    """
+
+    result = response['chart']['result'][0]
+    currency = result['meta']['currency']
+    quote = result['indicators']['quote'][0]
+
+    timestampToDate = lambda timestamp: datetime.datetime.fromtimestamp(timestamp).date()
+    dates = numpy.array(list(map(timestampToDate, result.get('timestamp') or [])), dtype='datetime64[D]')
+    toArray = lambda values: numpy.array([numpy.nan if value is None else value for value in values], dtype=float)
+    history = {field: toArray(quote.get(field) or [None] * len(dates)) for field in HISTORY_FIELDS}
+
+    available = ~numpy.isnan(history['close'])
+    if startDate is not None and endDate is not None:
+        available &= (dates >= numpy.datetime64(startDate, 'D')) & (dates <= numpy.datetime64(endDate, 'D'))
+    history = {field: values[available] for field, values in history.items()}
+    history['date'] = dates[available]
+
+    # Somehow, sometimes, the last value provided is multiplied by a power of 10; the below
+    # attempts to detect when this occurs and corrects it. This would fail if the assumption
+    # that a daily market price could increase by one or more order of magnitudes does not
+    # hold (BTC I'm looking at you). This is a temporary remediation until more insight into
+    # the issue is obtained.
+    values = history['close']
+    reference = values[-2] if len(values) > 1 else previousClose
+    if len(values) and reference:
+        gap = round(math.log10(values[-1] / reference))
+        values[-1] /= (10 ** gap)
+
+    return currency, history
+
+
+def _toHistory(currency, history, columnar):
+    if columnar:
+        return _toFrame(currency, history)
+    return dict(zip(history['date'].tolist(), map(lambda value: Price(value, currency), history['close'].tolist())))
+
+
+def _toFrame(currency, history):
+    from pandas import DataFrame, DatetimeIndex
+    frame = DataFrame({field: history[field] for field in HISTORY_FIELDS}, index=DatetimeIndex(history['date'], name='date'))
+    frame.attrs['currency'] = currency
+    return frame
+
+
+def getPrices(symbols, useCache=True) -> Quotes:
+
+    """
+    Returns the current market prices for many tickers at once, requesting them in batches of as
+    many symbols as fit in a URL from the multi-symbol quote endpoint; symbols missing from the
+    batch responses (or whose batch failed) are then requested individually, in parallel.
+
+    Errors do not fail the whole request: they are reported by symbol instead.
+
+    Parameters
+    ----------
+        symbols: list[str]
+        useCache: bool
+
+    Return
+    ------
+        Quotes
+
+    Example
+    -------
+        >>> getPrices(['AAPL', 'SWDA.L', 'YEET'])
+        Quotes(prices={'AAPL': 150.1 USD, 'SWDA.L': 70.2 GBP}, errors={'YEET': KeyError(...)})
+    """
+
+    quotes, errors = _getQuotes(symbols, useCache=useCache)
+    prices = {}
+    for symbol, quote in quotes.items():
+        try:
+            prices[symbol] = Price(quote['regularMarketPrice'], quote['currency'])
+        except (KeyError, TypeError) as error:
+            errors[symbol] = error
+    return Quotes(prices, errors)
+
+
+def _getQuotes(symbols, useCache=True):
+
+    """
+    Returns the raw quotes (as found in the quote endpoint results or in the chart metadata) by
+    symbol, alongside the errors by symbol for those which could not be retrieved.
+    """
+
+    symbols = list(dict.fromkeys(symbols))
+    quotes = {}
+
+    for batch in _getQuoteBatches(symbols):
+        try:
+            response = yahoo.sendRequest(_getQuoteURL(batch), useCache=useCache)
+            for result in (response.get('quoteResponse') or {}).get('result') or []:
+                if result.get('symbol') in batch:
+                    quotes[result['symbol']] = result
+        except Exception:
+            pass
+
+    def getQuote(symbol):
+        return yahoo.sendRequest(_getPriceURL(symbol), useCache=useCache)['chart']['result'][0]['meta']
+
+    missingQuotes, errors = _mapConcurrently(getQuote, [symbol for symbol in symbols if symbol not in quotes])
+    quotes.update(missingQuotes)
+
+    return quotes, errors
+
+
+def _getQuoteURL(symbols):
+    return f'{yahoo.BASE_URL}/v7/finance/quote?symbols=' + ','.join(quote(symbol, safe='') for symbol in symbols)
+
+
+def _getQuoteBatches(symbols):
+
+    """Splits the symbols into batches, each fitting in a quote request URL."""
+
+    batches, batch, length = [], [], len(_getQuoteURL([]))
+    for symbol in symbols:
+        symbolLength = len(quote(symbol, safe='')) + 1
+        if batch and length + symbolLength > MAX_URL_LENGTH:
+            batches.append(batch)
+            batch, length = [], len(_getQuoteURL([]))
+        batch.append(symbol)
+        length += symbolLength
+    if batch:
+        batches.append(batch)
+    return batches
+
 
 class TickerException(Exception):
 
@@ -102,12 +474,50 @@ class AmbiguousTickerException(TickerException):
         super().__init__(f'More than one ticker was found for symbol \'{symbol}\' ({sorted(foundSymbols)}).')
 
 
+class SymbolRegistry(object):
+
+    """
+    Remembers, for a limited time, the symbols found when searching for a symbol, including when
+    none are found, so that validating the same symbol again requires no request.
+    """
+
+    def __init__(self, timeToLive):
+        self.timeToLive = timeToLive
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, symbol):
+
+        """Returns the symbols found for the given one, or None if it is not known (or has expired)."""
+
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(symbol, None)
+                return None
+            return entry[1]
+
+    def set(self, symbol, foundSymbols):
+        with self._lock:
+            self._entries[symbol] = (time.monotonic() + self.timeToLive, frozenset(foundSymbols))
+
+
+SYMBOL_REGISTRY = SymbolRegistry(SYMBOL_REGISTRY_TTL)
+
+
 def validateSymbol(symbol, allowMismatchIfOne=False):
 
     """
     Given a ticker symbol, it determines whether it exists and if its unambiguous and raises
     an exception if the validation fails.
 
+    The outcome of the search for the symbol is remembered in the SYMBOL_REGISTRY, so that it is
+    only requested once for as long as it is remembered.
+
     Paramters
     ---------
         symbol: str
@@ -126,10 +536,60 @@ def validateSymbol(symbol, allowMismatchIfOne=False):
             the 'allowMismatchIfOne' is not set).
     """
 
-    URL = f'https://query1.finance.yahoo.com/v1/finance/search?q={symbol}&lang=en-US&region=US&quotesCount=10'
-    response = yahoo.sendRequest(URL)
+    foundSymbols = SYMBOL_REGISTRY.get(symbol)
+    if foundSymbols is None:
+        foundSymbols = _parseSymbols(yahoo.sendRequest(_getSearchURL(symbol)))
+        SYMBOL_REGISTRY.set(symbol, foundSymbols)
+    _checkSymbol(symbol, foundSymbols, allowMismatchIfOne)
+
+
+async def validateSymbolAsync(symbol, allowMismatchIfOne=False):
+
+    """Asynchronous counterpart of validateSymbol."""
+
+    foundSymbols = SYMBOL_REGISTRY.get(symbol)
+    if foundSymbols is None:
+        foundSymbols = _parseSymbols(await yahoo.sendRequestAsync(_getSearchURL(symbol)))
+        SYMBOL_REGISTRY.set(symbol, foundSymbols)
+    _checkSymbol(symbol, foundSymbols, allowMismatchIfOne)
+
+
+def validateSymbols(symbols, allowMismatchIfOne=False):
+
+    """
+    Validates many symbols at once, requesting those not already in the SYMBOL_REGISTRY
+    concurrently, and returns the errors by symbol for those whose validation failed rather than
+    raising them.
+
+    Parameters
+    ----------
+        symbols: list[str]
+        allowMismatchIfOne: bool
+            See validateSymbol.
+
+    Return
+    ------
+        dict[str: Exception]
+
+    Example
+    -------
+        >>> validateSymbols(['AAPL', 'SWDA.L', 'YEET'])
+        {'YEET': TickerNotFoundException("No ticker could be found with symbol 'YEET'.")}
+    """
+
+    _, errors = _mapConcurrently(lambda symbol: validateSymbol(symbol, allowMismatchIfOne), symbols)
+    return errors
+
+
+def _getSearchURL(symbol):
+    return f'{yahoo.BASE_URL}/v1/finance/search?q={symbol}&lang=en-US&region=US&quotesCount=10'
+
+
+def _parseSymbols(response):
+    return set(map(lambda quote: quote['symbol'], response.get('quotes', [])))
+
 
-    foundSymbols = set(map(lambda quote: quote['symbol'], response.get('quotes', [])))
+def _checkSymbol(symbol, foundSymbols, allowMismatchIfOne):
 
     if not foundSymbols:
         raise TickerNotFoundException(symbol)
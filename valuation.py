@@ -0,0 +1,118 @@
+from collections import namedtuple
+import datetime
+import numpy
+from currency import getExchangeRates
+from order import Orders
+from price import Price
+import ticker
+
+
+CLOSE_LOOKBACK = datetime.timedelta(days=14)
+
+Valuation = namedtuple('Valuation', ['values', 'errors'])
+Valuation.__doc__ = """
+The result of a portfolio valuation: the values by date, alongside the errors by symbol for those
+whose history could not be retrieved.
+"""
+
+
+def getPortfolioValues(orders, startDate, endDate, currency: str, columnar: bool=False):
+
+    """
+    Returns the value, in the given currency, of the holdings resulting from the orders for each
+    day in the specified (inclusive) interval.
+
+    The histories of the symbols held at some point within the interval are loaded concurrently
+    into the HISTORY_STORE (see ticker.loadHistories), without validating the symbols beforehand;
+    the holdings, closes and exchange rates are then laid out as matrices of dates by symbols and
+    multiplied in one vectorized pass. Closes and exchange rates are carried forward over days
+    without any (e.g. weekends), and days on which a held symbol has no close or exchange rate yet
+    are valued as NaN.
+
+    Errors requesting histories do not fail the whole valuation: they are reported by symbol, and
+    the days on which those symbols are held are valued as NaN.
+
+    Parameters
+    ----------
+        orders: Orders | list[Order]
+        startDate: datetime.date
+        endDate: datetime.date
+        currency: str
+        columnar: bool
+            If set, the values are returned as a series indexed by date, rather than as Prices.
+
+    Return
+    ------
+        Valuation
+            The values, as dict[datetime.date: Price] | pandas.Series, and the errors by symbol.
+
+    Example
+    -------
+        >>> getPortfolioValues(Orders.fromFile('orders.json'), datetime.date(2021, 1, 1), datetime.date(2021, 1, 3), 'GBP')
+        Valuation(values={datetime.date(2021, 1, 1): 1040.3 GBP, datetime.date(2021, 1, 2): 1040.3 GBP, datetime.date(2021, 1, 3): 1040.3 GBP}, errors={})
+    """
+
+    orders = orders if isinstance(orders, Orders) else Orders(list(orders))
+    table = orders.table
+    dates = numpy.arange(numpy.datetime64(startDate, 'D'), numpy.datetime64(endDate, 'D') + 1)
+
+    # Only the symbols held at some point within the interval are valued;
+    holdings = _getHoldings(table, dates)
+    held = (holdings != 0).any(axis=0)
+    holdings = holdings[:, held]
+    symbols = [symbol for symbol, isHeld in zip(table.symbols, held.tolist()) if isHeld]
+    histories, errors = _getHistories(symbols, startDate - CLOSE_LOOKBACK, endDate)
+
+    closes = numpy.full(holdings.shape, numpy.nan)
+    rates = numpy.full(holdings.shape, numpy.nan)
+    columnsByCurrency = {}
+    for column, symbol in enumerate(symbols):
+        if symbol not in histories:
+            continue
+        symbolCurrency, history = histories[symbol]
+        columnsByCurrency.setdefault(symbolCurrency, []).append(column)
+        known = ~numpy.isnan(history['close'])
+        historyDates, historyCloses = history['date'][known], history['close'][known]
+        rows = numpy.searchsorted(historyDates, dates, side='right') - 1
+        closes[rows >= 0, column] = historyCloses[rows[rows >= 0]]
+
+    for symbolCurrency, columns in columnsByCurrency.items():
+        rates[:, columns] = getExchangeRates(symbolCurrency, currency, dates=dates, asOf=True)[:, None]
+
+    with numpy.errstate(invalid='ignore'):
+        values = numpy.where(holdings != 0, holdings * closes * rates, 0.).sum(axis=1)
+
+    if columnar:
+        from pandas import DatetimeIndex, Series
+        series = Series(values, index=DatetimeIndex(dates, name='date'), name='value')
+        series.attrs['currency'] = currency
+        return Valuation(series, errors)
+    return Valuation(dict(zip(dates.tolist(), map(lambda value: Price(value, currency), values.tolist()))), errors)
+
+
+def _getHoldings(table, dates):
+
+    """
+    Returns the quantity held of each symbol of the table (by column) at the end of each date, as
+    the cumulative sum of the signed order quantities; orders before the first date are counted on
+    it and orders after the last date are ignored.
+    """
+
+    columns = table.columns
+    holdings = numpy.zeros((len(dates), len(table.symbols)))
+    included = columns['date'] <= dates[-1] if len(dates) else numpy.zeros(len(table), dtype=bool)
+    rows = numpy.searchsorted(dates, columns['date'][included], side='left')
+    numpy.add.at(holdings, (rows, columns['symbol'][included]), columns['direction'][included] * columns['quantity'][included])
+    return numpy.cumsum(holdings, axis=0)
+
+
+def _getHistories(symbols, startDate, endDate):
+
+    """
+    Returns the currency and the columnar history of each of the symbols, loaded concurrently into
+    the HISTORY_STORE, alongside the errors by symbol for those which could not be retrieved.
+    """
+
+    store = ticker.HISTORY_STORE
+    errors = ticker.loadHistories(symbols, startDate, endDate, store)
+    return {symbol: store.get(symbol, startDate, endDate) for symbol in symbols if symbol not in errors}, errors
@@ -1,51 +1,598 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from urllib.parse import parse_qs, urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+BASE_URL = 'https://query1.finance.yahoo.com'
+
+# Requests failing with these status codes (or with connection errors) are retried, up to
+# MAX_RETRIES times, after an exponential backoff with full jitter (capped to MAX_BACKOFF seconds);
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 30.
+
+# Requests are throttled client-side to RATE_LIMIT requests per second, allowing bursts of up to
+# RATE_LIMIT_BURST requests; a rate limit of None disables throttling;
+RATE_LIMIT = 10.
+RATE_LIMIT_BURST = 20
+
+POOL_SIZE = 32
+TIMEOUT = 30.
+
+# The maximum number of asynchronous requests in flight at once, per event loop;
+ASYNC_CONCURRENCY = 32
+
+# Responses are cached, up to CACHE_MAX_SIZE of them (least recently used ones being evicted first),
+# for a time depending on the endpoint: see getTimeToLive;
+CACHE_MAX_SIZE = 4096
+QUOTE_TTL = 15.
+OPEN_HISTORY_TTL = 5 * 60.
+CLOSED_HISTORY_TTL = 7 * 24 * 60 * 60.
+SEARCH_TTL = 6 * 60 * 60.
+DEFAULT_TTL = 5 * 60.
+
+# Expired responses are deleted from the persistent cache when it is opened and then every
+# PERSISTENT_CACHE_PURGE_INTERVAL responses stored in it, so that its file does not grow unbounded;
+PERSISTENT_CACHE_PURGE_INTERVAL = 1000
 
 _HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/95.0.4638.69 Safari/537.36'
 }
 
-_CACHE = {}
+_CACHE = None
+
+_PERSISTENT_CACHE = None
+
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
 
+_SESSION = None
+_RATE_LIMITER = None
+_EXECUTOR = None
+_SEMAPHORES = weakref.WeakKeyDictionary()
+_ASYNC_SESSIONS = weakref.WeakKeyDictionary()
+_ASYNC_IN_FLIGHT = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
 
-def sendRequest(URL, useCache=True):
+
+def sendRequest(URL, useCache=True, store=True):
 
     """
     Sends an HTTP GET request to a Yahoo Finance REST API endpoint and returns its parsed JSON
     content.
 
+    It is thread-safe and concurrent requests for the same URL are coalesced: while a request is
+    in flight, other callers for the same URL wait for it and receive its response (or its error)
+    rather than sending their own.
+
+    If a persistent cache is set (see setPersistentCache), responses missing from the in-memory
+    cache are looked up there before being requested, and requested ones are stored there.
+
+    Parameters
+    ----------
+        URL: str
+        useCache: bool
+            If not set, cached responses are not used.
+        store: bool
+            If not set, the response is not stored in the caches (e.g. for bulk requests, whose
+            responses would otherwise fill the in-memory cache).
+
+    Return
+    ------
+        object
+
+    Raises
+    ------
+        requests.HTTPError
+            If the response status is an error, once retries (if any) are exhausted; error
+            responses are never cached.
+    """
+
+    with _IN_FLIGHT_LOCK:
+        if useCache and _hasCache(URL):
+            return _getCache(URL)
+        call = _IN_FLIGHT.get(URL)
+        isLeader = call is None
+        if isLeader:
+            call = _IN_FLIGHT[URL] = _Call()
+
+    if not isLeader:
+        return call.wait()
+
+    try:
+        persistentCache = _PERSISTENT_CACHE
+        entry = persistentCache.get(URL) if useCache and persistentCache else None
+        if entry is not None:
+            call.response, timeToLive = entry
+        else:
+            call.response, timeToLive = _doSendRequest(URL), getTimeToLive(URL)
+            if store and persistentCache:
+                persistentCache.set(URL, call.response, timeToLive)
+        if store:
+            _setCache(URL, call.response, timeToLive)
+        return call.response
+    except BaseException as error:
+        call.error = error
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            del _IN_FLIGHT[URL]
+        call.done.set()
+
+
+async def sendRequestAsync(URL, useCache=True, store=True):
+
+    """
+    Asynchronous counterpart of sendRequest, so that many requests can be awaited concurrently
+    (e.g. with asyncio.gather) from an event loop, with at most ASYNC_CONCURRENCY of them in flight
+    at once per event loop.
+
+    If aiohttp is installed, requests are sent without blocking the event loop, through a session
+    pooling the connections of each event loop (see closeAsyncSession), and go through the same
+    caches, retries and rate limiting as sendRequest; concurrent requests for the same URL from the
+    same event loop are coalesced. Otherwise, sendRequest is run on a dedicated pool of POOL_SIZE
+    threads.
+
     Parameters
     ----------
         URL: str
         useCache: bool
+        store: bool
+            See sendRequest.
 
     Return
     ------
         object
+
+    Example
+    -------
+        >>> await asyncio.gather(*(sendRequestAsync(URL) for URL in URLs))
     """
 
-    global _CACHE
+    async with _getSemaphore():
+
+        if aiohttp is None:
+            return await asyncio.get_running_loop().run_in_executor(_getExecutor(), sendRequest, URL, useCache, store)
+
+        with _IN_FLIGHT_LOCK:
+            if useCache and _hasCache(URL):
+                return _getCache(URL)
+
+        inFlight = _ASYNC_IN_FLIGHT.setdefault(asyncio.get_running_loop(), {})
+        if URL in inFlight:
+            return await asyncio.shield(inFlight[URL])
+
+        task = inFlight[URL] = asyncio.ensure_future(_sendRequestAsync(URL, useCache, store))
+        task.add_done_callback(lambda _: inFlight.pop(URL, None))
+        return await asyncio.shield(task)
+
+
+async def _sendRequestAsync(URL, useCache, store):
 
-    if _hasCache(URL) and useCache:
-        return _getCache(URL)
+    # The persistent cache is read and written on the thread pool, as SQLite would block the event loop;
+    loop, persistentCache = asyncio.get_running_loop(), _PERSISTENT_CACHE
+    entry = await loop.run_in_executor(_getExecutor(), persistentCache.get, URL) if useCache and persistentCache else None
+    if entry is not None:
+        response, timeToLive = entry
     else:
-        response = _doSendRequest(URL)        
-        _setCache(URL, response)
-        return response    
+        response, timeToLive = await _doSendRequestAsync(URL), getTimeToLive(URL)
+        if store and persistentCache:
+            await loop.run_in_executor(_getExecutor(), persistentCache.set, URL, response, timeToLive)
+    if store:
+        _setCache(URL, response, timeToLive)
+    return response
+
+
+async def closeAsyncSession():
+
+    """
+    Closes the aiohttp session of the running event loop, if any; it should be awaited before the
+    event loop is closed, so that its connections are released.
+
+    Example
+    -------
+        >>> async def main():
+        ...     try:
+        ...         return await sendRequestAsync(URL)
+        ...     finally:
+        ...         await closeAsyncSession()
+    """
+
+    session = _ASYNC_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def getTimeToLive(URL):
+
+    """
+    Returns for how long, in seconds, the response for the given URL is cached: quotes (chart
+    requests for a range) only briefly, histories (chart requests for a period) for long if the
+    period has ended before today and briefly otherwise, and symbol searches for hours.
+
+    Parameters
+    ----------
+        URL: str
+
+    Return
+    ------
+        float
+    """
+
+    URL = urlsplit(URL)
+    parameters = parse_qs(URL.query)
+
+    if URL.path.endswith('/finance/search'):
+        return SEARCH_TTL
+    if '/finance/chart/' in URL.path or URL.path.endswith('/finance/quote'):
+        if 'period2' in parameters:
+            periodEnd = int(parameters['period2'][0])
+            return CLOSED_HISTORY_TTL if periodEnd < time.time() - 24 * 60 * 60 else OPEN_HISTORY_TTL
+        return QUOTE_TTL
+    return DEFAULT_TTL
+
+
+def setPersistentCache(path):
+
+    """
+    Sets a SQLite file as persistent cache of responses, shared by all the processes using it and
+    honouring the same expiry as the in-memory cache, or disables it if no path is provided.
+
+    Parameters
+    ----------
+        path: str | None
+
+    Example
+    -------
+        >>> setPersistentCache(os.path.expanduser('~/.cache/pynance/yahoo.sqlite'))
+    """
+
+    global _PERSISTENT_CACHE
+    _PERSISTENT_CACHE = _PersistentCache(path) if path else None
+
+
+def getCacheStats():
+
+    """
+    Returns the number of cached responses and the cache hits, misses, evictions and expirations
+    since the cache was last cleared.
+
+    Return
+    ------
+        dict[str: int]
+    """
+
+    return _CACHE.getStats()
+
+
+def clearCache():
+    _CACHE.clear()
+
+
+def configure(maxRetries=None, backoffFactor=None, maxBackoff=None, rateLimit=None, rateLimitBurst=None, poolSize=None):
+
+    """
+    Updates the retry, rate limiting and connection pooling settings; settings not provided are
+    left unchanged. The shared session and rate limiter are recreated with the new settings.
+
+    Parameters
+    ----------
+        maxRetries: int
+        backoffFactor: float
+            The base, in seconds, of the exponential backoff between retries.
+        maxBackoff: float
+        rateLimit: float
+            The maximum sustained number of requests per second.
+        rateLimitBurst: int
+        poolSize: int
+            The maximum number of connections kept alive.
+
+    Example
+    -------
+        >>> configure(maxRetries=2, rateLimit=5.)
+    """
+
+    global MAX_RETRIES, BACKOFF_FACTOR, MAX_BACKOFF, RATE_LIMIT, RATE_LIMIT_BURST, POOL_SIZE, _SESSION, _RATE_LIMITER
+
+    with _LOCK:
+        MAX_RETRIES = MAX_RETRIES if maxRetries is None else maxRetries
+        BACKOFF_FACTOR = BACKOFF_FACTOR if backoffFactor is None else backoffFactor
+        MAX_BACKOFF = MAX_BACKOFF if maxBackoff is None else maxBackoff
+        RATE_LIMIT = RATE_LIMIT if rateLimit is None else rateLimit
+        RATE_LIMIT_BURST = RATE_LIMIT_BURST if rateLimitBurst is None else rateLimitBurst
+        POOL_SIZE = POOL_SIZE if poolSize is None else poolSize
+        _SESSION = None
+        _RATE_LIMITER = None
 
 
 def _doSendRequest(URL):
-    return requests.get(URL, headers=_HEADERS).json()
+
+    session, rateLimiter = _getSession(), _getRateLimiter()
+
+    for attempt in range(MAX_RETRIES + 1):
+
+        if rateLimiter:
+            rateLimiter.acquire()
+
+        try:
+            response = session.get(URL, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(_getBackoff(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES:
+            if attempt == MAX_RETRIES:
+                response.raise_for_status()
+            time.sleep(_getBackoff(attempt, response.headers.get('Retry-After')))
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+
+async def _doSendRequestAsync(URL):
+
+    session, rateLimiter = _getAsyncSession(), _getRateLimiter()
+
+    for attempt in range(MAX_RETRIES + 1):
+
+        if rateLimiter:
+            await asyncio.sleep(rateLimiter.reserve())
+
+        try:
+            async with session.get(URL) as response:
+                if response.status in RETRY_STATUS_CODES:
+                    if attempt == MAX_RETRIES:
+                        response.raise_for_status()
+                    backoff = _getBackoff(attempt, response.headers.get('Retry-After'))
+                else:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            backoff = _getBackoff(attempt)
+
+        await asyncio.sleep(backoff)
+
+
+def _getBackoff(attempt, retryAfter=None):
+
+    """Returns the time to wait before a retry: exponential backoff with full jitter, but no less than the server asks for."""
+
+    backoff = random.uniform(0, min(MAX_BACKOFF, BACKOFF_FACTOR * 2 ** attempt))
+    if retryAfter and retryAfter.isdigit():
+        backoff = max(backoff, min(MAX_BACKOFF, float(retryAfter)))
+    return backoff
+
+
+def _getSession():
+    global _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _SESSION = requests.Session()
+            _SESSION.headers.update(_HEADERS)
+            _SESSION.mount('http://', adapter)
+            _SESSION.mount('https://', adapter)
+        return _SESSION
+
+
+def _getExecutor():
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='yahoo')
+        return _EXECUTOR
+
+
+def _getAsyncSession():
+    loop = asyncio.get_running_loop()
+    session = _ASYNC_SESSIONS.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=ASYNC_CONCURRENCY)
+        session = _ASYNC_SESSIONS[loop] = aiohttp.ClientSession(connector=connector, headers=_HEADERS, timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+    return session
+
+
+def _getSemaphore():
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        semaphore = _SEMAPHORES.get(loop)
+        if semaphore is None:
+            semaphore = _SEMAPHORES[loop] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+        return semaphore
+
+
+def _getRateLimiter():
+    global _RATE_LIMITER
+    with _LOCK:
+        if _RATE_LIMITER is None and RATE_LIMIT:
+            _RATE_LIMITER = _TokenBucket(RATE_LIMIT, RATE_LIMIT_BURST)
+        return _RATE_LIMITER
+
+
+class _TokenBucket(object):
+
+    """
+    A token bucket rate limiter: tokens are replenished at a constant rate up to a maximum capacity
+    and each request consumes one, waiting for it if none is available. Waiting requests reserve
+    their token upfront, so that they are served in order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def reserve(self):
+
+        """Reserves a token and returns how long to wait, in seconds, before using it."""
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class _Call(object):
+
+    """A request in flight, whose response (or error) is shared with all callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class _ResponseCache(object):
+
+    """A bounded cache of responses by URL, with least recently used eviction and per-entry expiry."""
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def has(self, URL):
+        with self.lock:
+            entry = self.entries.get(URL)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self.entries[URL]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            self.entries.move_to_end(URL)
+            return True
+
+    def get(self, URL):
+        with self.lock:
+            entry = self.entries.get(URL)
+            if entry is None:
+                return None
+            self.entries.move_to_end(URL)
+            return entry[1]
+
+    def set(self, URL, response, timeToLive):
+        with self.lock:
+            self.entries[URL] = (time.monotonic() + timeToLive, response)
+            self.entries.move_to_end(URL)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def getStats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'expirations': self.expirations}
+
+
+_CACHE = _ResponseCache(CACHE_MAX_SIZE)
+
+
+class _PersistentCache(object):
+
+    """
+    A cache of responses by URL in a SQLite file, as zlib-compressed JSON with an expiry time. The
+    database uses write-ahead logging, so that readers and a writer from several processes can use
+    it concurrently; each thread uses its own connection. Expired responses are purged when the
+    cache is opened and periodically as responses are stored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.setCount = 0
+        with self._getConnection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS responses (URL TEXT PRIMARY KEY, expiry REAL NOT NULL, payload BLOB NOT NULL)')
+        self.purge()
+
+    def _getConnection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=30.)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def get(self, URL):
+
+        """Returns the response for the URL and for how many more seconds it is valid, or None if there is no valid one."""
+
+        now = time.time()
+        row = self._getConnection().execute('SELECT expiry, payload FROM responses WHERE URL = ? AND expiry > ?', (URL, now)).fetchone()
+        if row is None:
+            return None
+        expiry, payload = row
+        return json.loads(zlib.decompress(payload)), expiry - now
+
+    def set(self, URL, response, timeToLive):
+        payload = zlib.compress(json.dumps(response, separators=(',', ':')).encode())
+        with self._getConnection() as connection:
+            connection.execute('INSERT OR REPLACE INTO responses (URL, expiry, payload) VALUES (?, ?, ?)', (URL, time.time() + timeToLive, payload))
+        with self.lock:
+            self.setCount += 1
+            isPurgeDue = self.setCount % PERSISTENT_CACHE_PURGE_INTERVAL == 0
+        if isPurgeDue:
+            self.purge()
+
+    def purge(self):
+
+        """Deletes the expired responses."""
+
+        with self._getConnection() as connection:
+            connection.execute('DELETE FROM responses WHERE expiry <= ?', (time.time(),))
 
 
 def _getCache(URL):
     return _CACHE.get(URL)
 
 
-def _setCache(URL, response):
-    global _CACHE
-    _CACHE[URL] = response
+def _setCache(URL, response, timeToLive=None):
+    _CACHE.set(URL, response, getTimeToLive(URL) if timeToLive is None else timeToLive)
 
 
 def _hasCache(URL):
-    return URL in _CACHE
\ No newline at end of file
+    return _CACHE.has(URL)